@@ -11,6 +11,11 @@ import os
 import time
 import io
 
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
 
 router = APIRouter()
 
@@ -21,6 +26,22 @@ def load_ocr_model():
     return model
 
 
+def render_first_page(pdf_bytes, dpi=300):
+    # Render in-process with pdfium when available, otherwise fall back to poppler.
+    # Only the first page is used for OCR, so only the first page is rendered.
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            page = pdf[0]
+            image = page.render(scale=dpi / 72).to_pil()
+            page.close()
+            return image
+        finally:
+            pdf.close()
+
+    return convert_from_bytes(pdf_bytes, dpi, first_page=1, last_page=1)[0]
+
+
 def merge_data(values):
     data = []
     for idx in range(len(values)):
@@ -73,8 +94,7 @@ async def inference(file: UploadFile = File(None),
             doc = Image.open(BytesIO(await file.read()))
         elif file.content_type == "application/pdf":
             pdf_bytes = await file.read()
-            pages = convert_from_bytes(pdf_bytes, 300)
-            doc = pages[0]
+            doc = render_first_page(pdf_bytes)
         else:
             return {"error": "Invalid file type. Only JPG/PNG images and PDF are allowed."}
 
@@ -93,8 +113,7 @@ async def inference(file: UploadFile = File(None),
                 doc = Image.open(BytesIO(response.read()))
             elif content_type in ["application/pdf", "application/octet-stream"]:
                 pdf_bytes = response.read()
-                pages = convert_from_bytes(pdf_bytes, 300)
-                doc = pages[0]
+                doc = render_first_page(pdf_bytes)
             else:
                 return {"error": "Invalid file type. Only JPG/PNG images and PDF are allowed."}
 
@@ -2,22 +2,64 @@ import json
 from vessel_parse.vllm.inference_factory import InferenceFactory
 from vessel_parse.helpers.pdf_optimizer import PDFOptimizer
 from vessel_parse.helpers.image_optimizer import ImageOptimizer
+from vessel_parse.helpers.page_selection import parse_page_selection
+from vessel_parse.helpers.page_dedup import PageDeduplicator
 from vessel_parse.processors.table_structure_processor import TableDetector
 from rich import print
-import os
+import queue
 import tempfile
+import threading
 import shutil
 
 
 class VLLMExtractor(object):
+    # PDFs up to this many pages are handed between stages as in-memory images.
+    # Longer documents spill rendered pages to a temporary directory so that peak memory stays bounded.
+    IN_MEMORY_MAX_PAGES = 16
+    # Placeholder result for blank pages skipped before inference, keeps page numbering intact
+    BLANK_PAGE_RESULT = json.dumps({"message": "Blank page, inference skipped", "blank_page": "true"}, indent=4)
+    # Pages prepared ahead of inference when progress is reported without an explicit prefetch_pages
+    PROGRESS_PREFETCH_PAGES = 2
+
     def __init__(self):
         pass
 
     def run_inference(self, model_inference_instance, input_data, tables_only=False,
-                      generic_query=False, crop_size=None, debug_dir=None, debug=False, mode=None):
+                      generic_query=False, crop_size=None, debug_dir=None, debug=False, mode=None,
+                      prefetch_pages=None, pages=None, text_layer=False, skip_blank_pages=False, dedup_pages=False,
+                      progress_callback=None):
         """
         Main entry point for processing input data using a model inference instance.
         Handles generic queries, PDFs, and table extraction.
+
+        input_data[0]["file_path"] can be a file path, raw bytes or a PIL image. Pages are passed between
+        stages in memory, only debug_dir forces debug copies to be written.
+
+        When prefetch_pages is set, PDF pages are processed in producer/consumer mode: the next pages are
+        rendered, cropped and table-detected on a background thread while the current page is in inference,
+        with at most prefetch_pages prepared pages waiting in the queue.
+
+        pages selects the PDF pages to process, as ranges and explicit pages ("3-5,7" or [3, 4, 5, 7]).
+        Only the selected pages are rendered and sent to the model, and the returned page count is the
+        number of selected pages.
+
+        When text_layer is set, PDF pages with a usable text layer (digital-born pages) are queried with their
+        extracted text instead of a rendered image, through the backend's text-only inference. Scanned pages,
+        tables_only mode and backends without text-only inference use the vision path.
+
+        When skip_blank_pages is set, blank and near-empty PDF pages are detected from a downsampled copy before
+        inference and get BLANK_PAGE_RESULT instead of a model result. True uses the default threshold, a float
+        sets the largest share of content pixels for a blank page (see ImageOptimizer.is_blank_page).
+
+        When dedup_pages is set, identical PDF pages are inferred once for the same prompt and model, and the
+        result is reused for every duplicate. The index is kept per process (PageDeduplicator), so duplicates
+        are also found across the documents processed by the same process.
+
+        When progress_callback is set, it is called with progress events (dicts) while the document is processed:
+        {"event": "start", "pages": N} once, then per page {"event": "page_start", "page": n},
+        {"event": "token", "page": n, "text": "..."} for each generated chunk when the backend streams tokens
+        (see ModelInference.token_callback), and {"event": "page_done", "page": n, "result": "..."}. PDF pages
+        are then inferred one at a time in pipelined mode. Text layer pages complete before the vision pages.
         """
         if generic_query:
             input_data[0]["text_input"] = "retrieve document data. return response in JSON format"
@@ -27,100 +69,261 @@ class VLLMExtractor(object):
 
         file_path = input_data[0]["file_path"]
         if self.is_pdf(file_path):
-            return self._process_pdf(model_inference_instance, input_data, tables_only, crop_size, debug, debug_dir, mode)
+            return self._process_pdf(model_inference_instance, input_data, tables_only, crop_size, debug, debug_dir, mode,
+                                     prefetch_pages, pages, text_layer, skip_blank_pages, dedup_pages,
+                                     progress_callback)
 
-        return self._process_non_pdf(model_inference_instance, input_data, tables_only, crop_size, debug, debug_dir)
+        return self._process_non_pdf(model_inference_instance, input_data, tables_only, crop_size, debug, debug_dir,
+                                     progress_callback)
 
 
-    def _process_pdf(self, model_inference_instance, input_data, tables_only, crop_size, debug, debug_dir, mode):
+    def _process_pdf(self, model_inference_instance, input_data, tables_only, crop_size, debug, debug_dir, mode,
+                     prefetch_pages=None, pages=None, text_layer=False, skip_blank_pages=False, dedup_pages=False,
+                     progress_callback=None):
         """
         Handles processing and inference for PDF files, including page splitting and optional table extraction.
         """
         pdf_optimizer = PDFOptimizer()
-        num_pages, output_files, temp_dir = pdf_optimizer.split_pdf_to_pages(input_data[0]["file_path"],
-                                                                             debug_dir, convert_to_images=True)
+        file_path = input_data[0]["file_path"]
+        total_pages = pdf_optimizer.get_page_count(file_path)
+        page_numbers = parse_page_selection(pages, total_pages) or list(range(1, total_pages + 1))
+        num_pages = len(page_numbers)
+        self._emit(progress_callback, "start", pages=num_pages)
+
+        text_results = {}
+        if text_layer and not tables_only:
+            text_results = self._process_text_layer_pages(model_inference_instance, input_data, file_path,
+                                                          page_numbers, debug)
+            for page_num, result in text_results.items():
+                self._emit(progress_callback, "page_done", page=page_num, result=result)
+
+        vision_page_numbers = [page_num for page_num in page_numbers if page_num not in text_results]
+        vision_results = []
+        if vision_page_numbers:
+            # Progress is reported page by page, which is what pipelined mode does
+            if progress_callback is not None and not prefetch_pages:
+                prefetch_pages = self.PROGRESS_PREFETCH_PAGES
+            vision_results = self._process_pdf_images(pdf_optimizer, model_inference_instance, input_data, tables_only,
+                                                      crop_size, debug, debug_dir, prefetch_pages,
+                                                      vision_page_numbers, skip_blank_pages, dedup_pages,
+                                                      progress_callback)
+
+        if not text_results:
+            return vision_results, num_pages
+
+        # Merge both paths back into page order, vision inference returns one result per page
+        vision_results = iter(vision_results)
+        results = [text_results[page_num] if page_num in text_results else next(vision_results)
+                   for page_num in page_numbers]
+
+        return results, num_pages
+
+
+    def _process_pdf_images(self, pdf_optimizer, model_inference_instance, input_data, tables_only, crop_size, debug,
+                            debug_dir, prefetch_pages, page_numbers, skip_blank_pages=False, dedup_pages=False,
+                            progress_callback=None):
+        """
+        Renders the given PDF pages and runs vision inference or table extraction on them.
+        """
+        deduplicator = PageDeduplicator.get_default() if dedup_pages else None
+        file_path = input_data[0]["file_path"]
+        temp_dir = tempfile.mkdtemp() if len(page_numbers) > self.IN_MEMORY_MAX_PAGES else None
 
-        results = self._process_pages(model_inference_instance, output_files, input_data, tables_only, crop_size, debug, debug_dir)
+        # Pages are rendered window by window and consumed as soon as they are ready.
+        # Border cropping happens at render time, so cropped pages can be served from the page cache.
+        # Whole pages are rendered at the resolution the backend accepts; table crops keep full resolution.
+        if tables_only:
+            page_crop_size, max_size = None, None
+        else:
+            page_crop_size, max_size = crop_size, getattr(model_inference_instance, "max_image_size", None)
+        output_files = pdf_optimizer.stream_pdf_to_images(file_path, temp_dir, debug_dir, crop_size=page_crop_size,
+                                                          max_size=max_size, page_numbers=page_numbers)
+
+        if prefetch_pages:
+            results = self._process_pages_pipelined(model_inference_instance, output_files, input_data, tables_only,
+                                                    None, debug, debug_dir, prefetch_pages, page_numbers,
+                                                    skip_blank_pages, deduplicator, progress_callback)
+        else:
+            results = self._process_pages(model_inference_instance, output_files, input_data, tables_only, None,
+                                          debug, debug_dir, page_numbers, skip_blank_pages, deduplicator)
 
         # Clean up temporary directory
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        return results, num_pages
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        if debug and pdf_optimizer.cache is not None:
+            print("Page cache stats:", pdf_optimizer.cache.stats())
+        if debug and deduplicator is not None:
+            print("Page dedup stats:", deduplicator.stats())
+
+        return results
 
 
-    def _process_non_pdf(self, model_inference_instance, input_data, tables_only, crop_size, debug, debug_dir):
+    def _process_text_layer_pages(self, model_inference_instance, input_data, file_path, page_numbers, debug):
+        """
+        Runs text-only inference for pages with a usable text layer.
+
+        Returns:
+            dict: Page number to result for the pages handled from their text layer. Empty when no page has a
+            text layer or the backend does not support text-only inference.
+        """
+        page_texts = PDFOptimizer.extract_text_layer(file_path, page_numbers)
+        text_page_numbers = [page_num for page_num in page_numbers if page_texts[page_num] is not None]
+
+        if not text_page_numbers:
+            if debug:
+                print("No pages with a usable text layer, using vision inference.")
+            return {}
+
+        text_input_data = [
+            {
+                "page_text": [page_texts[page_num] for page_num in text_page_numbers],
+                "text_input": input_data[0]["text_input"]
+            }
+        ]
+
+        try:
+            results = model_inference_instance.text_inference(text_input_data)
+        except NotImplementedError as e:
+            print(f"Text layer skipped: {e}. Using vision inference for all pages.")
+            return {}
+
+        print(f"Text layer used for {len(text_page_numbers)} of {len(page_numbers)} pages: {text_page_numbers}")
+
+        return dict(zip(text_page_numbers, results))
+
+
+    def _process_non_pdf(self, model_inference_instance, input_data, tables_only, crop_size, debug, debug_dir,
+                         progress_callback=None):
         """
         Handles processing and inference for non-PDF files, with optional table extraction.
         """
         file_path = input_data[0]["file_path"]
+        self._emit(progress_callback, "start", pages=1)
 
         if tables_only:
-            return self._extract_tables(model_inference_instance, file_path, input_data, debug, debug_dir), 1
+            self._emit(progress_callback, "page_start", page=1)
+            results = self._extract_tables(model_inference_instance, file_path, input_data, debug, debug_dir)
+            self._emit(progress_callback, "page_done", page=1, result=results[0])
+            return results, 1
         else:
-            temp_dir = tempfile.mkdtemp()
-
             if crop_size:
                 if debug:
-                    print(f"Cropping image borders by {crop_size} pixels.")
+                    print("Cropping image borders to content." if crop_size == "auto" else
+                          f"Cropping image borders by {crop_size} pixels.")
                 image_optimizer = ImageOptimizer()
-                cropped_file_path = image_optimizer.crop_image_borders(file_path, temp_dir, debug_dir, crop_size)
-                input_data[0]["file_path"] = cropped_file_path
+                input_data[0]["file_path"] = image_optimizer.crop_image_borders(file_path, None, debug_dir, crop_size)
 
             file_path = input_data[0]["file_path"]
             input_data[0]["file_path"] = [file_path]
-            results = model_inference_instance.inference(input_data)
-
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            results = self._infer_page(model_inference_instance, input_data, 1, progress_callback)
+            self._emit(progress_callback, "page_done", page=1, result=results[0])
 
             return results, 1
 
-    def _process_pages(self, model_inference_instance, output_files, input_data, tables_only, crop_size, debug, debug_dir):
+    def _process_pages(self, model_inference_instance, output_files, input_data, tables_only, crop_size, debug, debug_dir,
+                       page_numbers=None, skip_blank_pages=False, deduplicator=None):
         """
         Processes individual pages (PDF split) and handles table extraction or inference.
 
         Args:
             model_inference_instance: The model inference object.
-            output_files: List of file paths for the split PDF pages.
+            output_files: List or iterable of the split PDF pages, as file paths or in-memory images.
             input_data: Input data for inference.
             tables_only: Whether to only process tables.
             crop_size: Size for cropping image borders.
             debug: Debug flag for logging.
             debug_dir: Directory for saving debug information.
+            page_numbers: Document page numbers of output_files, used to label pages. Defaults to 1..N.
+            skip_blank_pages: Whether (or the content ratio below which) blank pages skip inference.
+            deduplicator: PageDeduplicator to reuse results of duplicate pages, None to infer every page.
 
         Returns:
             List of results from the processing or inference.
         """
         results_array = []
+        blank_page_numbers = []
+        duplicate_page_numbers = []
 
         if tables_only:
             if debug:
-                print(f"Processing {len(output_files)} pages for table extraction.")
-            # Process each page individually for table extraction
+                print("Processing pages for table extraction.")
+
+            # Detect tables on every page first, in batched forward passes,
+            # then send all table crops of the document in one inference call
+            page_results = []
+            page_keys = {}
+            first_indexes = {}
+            detect_pages = []
             for i, file_path in enumerate(output_files):
-                tables_result = self._extract_tables(
-                    model_inference_instance, file_path, input_data, debug, debug_dir, page_index=i
-                )
-                # Since _extract_tables returns a list with one JSON string, unpack it
-                results_array.extend(tables_result)  # Unpack the single JSON string
+                page_index = page_numbers[i] - 1 if page_numbers else i
+                page_results.append(None)
+                if self._is_blank_page(file_path, skip_blank_pages):
+                    blank_page_numbers.append(page_index + 1)
+                    page_results[i] = self.BLANK_PAGE_RESULT
+                    continue
+
+                page_key = self._page_key(deduplicator, file_path, input_data, tables_only, model_inference_instance)
+                if page_key:
+                    page_keys[i] = page_key
+                    if page_key in first_indexes:
+                        duplicate_page_numbers.append(page_index + 1)
+                        continue
+                    first_indexes[page_key] = i
+
+                    cached_result = deduplicator.get(page_key)
+                    if cached_result is not None:
+                        duplicate_page_numbers.append(page_index + 1)
+                        page_results[i] = cached_result
+                        continue
+
+                detect_pages.append((i, page_index, file_path))
+
+            detected_tables = self._detect_tables_batch([file_path for _, _, file_path in detect_pages], debug,
+                                                        debug_dir, [page_index for _, page_index, _ in detect_pages])
+            page_tables = [(i, page_index, tables)
+                           for (i, page_index, _), tables in zip(detect_pages, detected_tables)]
+
+            tables_results = self._infer_table_batch(model_inference_instance,
+                                                     [(page_index, tables) for _, page_index, tables in page_tables],
+                                                     input_data)
+            for (i, _, _), tables_result in zip(page_tables, tables_results):
+                page_results[i] = tables_result
+                if i in page_keys:
+                    deduplicator.put(page_keys[i], tables_result)
+
+            # Fan results out to the duplicate pages
+            for i, page_key in page_keys.items():
+                if page_results[i] is None:
+                    page_results[i] = page_results[first_indexes[page_key]]
+
+            results_array.extend(page_results)
         else:
             if debug:
-                print(f"Processing {len(output_files)} pages for inference at once.")
+                print("Processing pages for inference at once.")
 
-            temp_dir = tempfile.mkdtemp()
+            temp_dir = None
             cropped_files = []
 
             if crop_size:
                 if debug:
-                    print(f"Cropping image borders by {crop_size} pixels from {len(output_files)} images.")
+                    print("Cropping image borders to content." if crop_size == "auto" else
+                          f"Cropping image borders by {crop_size} pixels.")
 
                 image_optimizer = ImageOptimizer()
 
                 # Process each file in the output_files array
-                for file_path in output_files:
+                for i, file_path in enumerate(output_files):
+                    # Pages spilled to disk are cropped to disk, in-memory pages stay in memory
+                    if isinstance(file_path, str) and temp_dir is None:
+                        temp_dir = tempfile.mkdtemp()
+
                     cropped_file_path = image_optimizer.crop_image_borders(
                         file_path,
-                        temp_dir,
+                        temp_dir if isinstance(file_path, str) else None,
                         debug_dir,
-                        crop_size
+                        crop_size,
+                        name=f"page_{i + 1}"
                     )
                     cropped_files.append(cropped_file_path)
 
@@ -128,56 +331,331 @@ class VLLMExtractor(object):
                 input_data[0]["file_path"] = cropped_files
             else:
                 # If no cropping needed, use original files directly
-                input_data[0]["file_path"] = output_files
-
-            # Process all files at once
-            results = model_inference_instance.inference(input_data)
-            results_array.extend(results)
+                input_data[0]["file_path"] = list(output_files)
+
+            page_files = input_data[0]["file_path"]
+            page_results = [None] * len(page_files)
+            page_keys = {}
+            first_indexes = {}
+            infer_indexes = []
+
+            for i, file_path in enumerate(page_files):
+                page_number = page_numbers[i] if page_numbers else i + 1
+                if self._is_blank_page(file_path, skip_blank_pages):
+                    blank_page_numbers.append(page_number)
+                    page_results[i] = self.BLANK_PAGE_RESULT
+                    continue
+
+                page_key = self._page_key(deduplicator, file_path, input_data, tables_only, model_inference_instance)
+                if page_key:
+                    page_keys[i] = page_key
+                    # Duplicates within the document wait for the result of the first occurrence
+                    if page_key in first_indexes:
+                        duplicate_page_numbers.append(page_number)
+                        continue
+                    first_indexes[page_key] = i
+
+                    cached_result = deduplicator.get(page_key)
+                    if cached_result is not None:
+                        duplicate_page_numbers.append(page_number)
+                        page_results[i] = cached_result
+                        continue
+
+                infer_indexes.append(i)
+
+            # Process all remaining files at once
+            input_data[0]["file_path"] = [page_files[i] for i in infer_indexes]
+            results = model_inference_instance.inference(input_data) if infer_indexes else []
+            for i, result in zip(infer_indexes, results):
+                page_results[i] = result
+                if i in page_keys:
+                    deduplicator.put(page_keys[i], result)
+
+            # Fan results out to the duplicate pages
+            for i, page_key in page_keys.items():
+                if page_results[i] is None:
+                    page_results[i] = page_results[first_indexes[page_key]]
+
+            results_array.extend(page_results)
 
             # Clean up temporary directory
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+        if skip_blank_pages:
+            self._report_blank_pages(blank_page_numbers, len(results_array))
+        if deduplicator is not None:
+            self._report_duplicate_pages(duplicate_page_numbers, len(results_array))
 
         return results_array
 
 
+    def _process_pages_pipelined(self, model_inference_instance, output_files, input_data, tables_only, crop_size,
+                                 debug, debug_dir, prefetch_pages, page_numbers=None, skip_blank_pages=False,
+                                 deduplicator=None, progress_callback=None):
+        """
+        Producer/consumer variant of _process_pages. A background thread renders, crops and detects tables
+        for the next pages while the current page is in inference. The queue between the two is bounded
+        by prefetch_pages, so memory stays flat.
+
+        Returns:
+            List of results, one per page, in page order.
+        """
+        page_queue = queue.Queue(maxsize=prefetch_pages)
+        stop_event = threading.Event()
+        end_of_pages = object()
+        blank_page = object()
+
+        def put(item):
+            # Do not block forever if the consumer stopped early
+            while not stop_event.is_set():
+                try:
+                    page_queue.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+
+        def produce():
+            try:
+                for i, file_path in enumerate(output_files):
+                    if stop_event.is_set():
+                        return
+                    page_index = page_numbers[i] - 1 if page_numbers else i
+                    if self._is_blank_page(file_path, skip_blank_pages):
+                        put((page_index, blank_page, None))
+                        continue
+                    page_key = self._page_key(deduplicator, file_path, input_data, tables_only,
+                                              model_inference_instance)
+                    put((page_index, self._prepare_page(file_path, page_index, tables_only, crop_size, debug,
+                                                        debug_dir), page_key))
+                put(end_of_pages)
+            except Exception as e:
+                put(e)
+
+        producer = threading.Thread(target=produce, name="vessel-page-producer", daemon=True)
+        producer.start()
+
+        if debug:
+            print(f"Processing pages in pipelined mode with prefetch of {prefetch_pages} pages.")
+
+        results_array = []
+        blank_page_numbers = []
+        duplicate_page_numbers = []
+        try:
+            while True:
+                item = page_queue.get()
+                if item is end_of_pages:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                page_index, page, page_key = item
+                if page is blank_page:
+                    blank_page_numbers.append(page_index + 1)
+                    results_array.append(self.BLANK_PAGE_RESULT)
+                    self._emit(progress_callback, "page_done", page=page_index + 1, result=self.BLANK_PAGE_RESULT)
+                    continue
+
+                cached_result = deduplicator.get(page_key) if page_key else None
+                if cached_result is not None:
+                    duplicate_page_numbers.append(page_index + 1)
+                    results_array.append(cached_result)
+                    self._emit(progress_callback, "page_done", page=page_index + 1, result=cached_result)
+                    continue
+
+                if tables_only:
+                    self._emit(progress_callback, "page_start", page=page_index + 1)
+                    page_results = self._infer_tables(model_inference_instance, page, input_data, page_index)
+                else:
+                    input_data[0]["file_path"] = [page]
+                    page_results = self._infer_page(model_inference_instance, input_data, page_index + 1,
+                                                    progress_callback)
+
+                if page_key:
+                    deduplicator.put(page_key, page_results[0])
+                results_array.extend(page_results)
+                self._emit(progress_callback, "page_done", page=page_index + 1, result=page_results[0])
+        finally:
+            stop_event.set()
+            producer.join()
+
+        if skip_blank_pages:
+            self._report_blank_pages(blank_page_numbers, len(results_array))
+        if deduplicator is not None:
+            self._report_duplicate_pages(duplicate_page_numbers, len(results_array))
+
+        return results_array
+
+
+    @staticmethod
+    def _emit(progress_callback, event, **fields):
+        """Sends a progress event to the callback, if there is one."""
+        if progress_callback is not None:
+            progress_callback(dict(event=event, **fields))
+
+
+    def _infer_page(self, model_inference_instance, input_data, page_number, progress_callback=None):
+        """
+        Runs inference for a single page. With a progress callback, the generated text is reported as token events
+        by backends that stream tokens.
+        """
+        if progress_callback is None:
+            return model_inference_instance.inference(input_data)
+
+        self._emit(progress_callback, "page_start", page=page_number)
+        model_inference_instance.token_callback = lambda text: self._emit(progress_callback, "token",
+                                                                          page=page_number, text=text)
+        try:
+            return model_inference_instance.inference(input_data)
+        finally:
+            model_inference_instance.token_callback = None
+
+
+    @staticmethod
+    def _page_key(deduplicator, file_path, input_data, tables_only, model_inference_instance):
+        """
+        Returns the deduplication key of a page, or None when deduplication is off. Results are only shared
+        between pages queried with the same prompt, extraction mode and model.
+        """
+        if deduplicator is None:
+            return None
+
+        return deduplicator.page_key(file_path, (input_data[0]["text_input"], tables_only),
+                                     model_inference_instance.model_id)
+
+
+    @staticmethod
+    def _report_duplicate_pages(duplicate_page_numbers, total_pages):
+        if duplicate_page_numbers:
+            print(f"Reused results for {len(duplicate_page_numbers)} duplicate pages of {total_pages}: "
+                  f"{duplicate_page_numbers}")
+
+
+    @staticmethod
+    def _is_blank_page(file_path, skip_blank_pages):
+        """
+        Checks if a page should skip inference as blank. skip_blank_pages is False, True for the default
+        threshold, or the largest share of content pixels for a blank page.
+        """
+        if not skip_blank_pages:
+            return False
+
+        max_content_ratio = None if skip_blank_pages is True else skip_blank_pages
+        return ImageOptimizer.is_blank_page(file_path, max_content_ratio)
+
+
+    @staticmethod
+    def _report_blank_pages(blank_page_numbers, total_pages):
+        if blank_page_numbers:
+            print(f"Skipped {len(blank_page_numbers)} blank pages of {total_pages}: {blank_page_numbers}")
+        else:
+            print(f"No blank pages found in {total_pages} pages.")
+
+
+    def _prepare_page(self, file_path, page_index, tables_only, crop_size, debug, debug_dir):
+        """
+        Runs the pre-processing of a single page: table detection in tables_only mode, border cropping otherwise.
+
+        Returns:
+            List of table crops in tables_only mode, otherwise the page as an in-memory image or file path.
+        """
+        if tables_only:
+            return self._detect_page_tables(file_path, debug, debug_dir, page_index)
+
+        if crop_size:
+            image_optimizer = ImageOptimizer()
+            return image_optimizer.crop_image_borders(file_path, None, debug_dir, crop_size,
+                                                      name=f"page_{page_index + 1}")
+
+        return file_path
+
+
     def _extract_tables(self, model_inference_instance, file_path, input_data, debug, debug_dir, page_index=None):
         """
-        Detects and processes tables from an input file.
+        Detects and processes tables from an input file. Table crops are passed to the model in memory,
+        all in a single inference call.
         """
+        cropped_tables = self._detect_page_tables(file_path, debug, debug_dir, page_index)
+        return self._infer_tables(model_inference_instance, cropped_tables, input_data, page_index)
+
+
+    @staticmethod
+    def _detect_tables_batch(file_paths, debug, debug_dir, page_indexes):
+        """
+        Detects tables in several pages with batched forward passes and returns the cropped table images per page.
+        """
+        if not file_paths:
+            return []
+
         table_detector = TableDetector()
-        cropped_tables = table_detector.detect_tables(file_path, local=False, debug_dir=debug_dir, debug=debug)
-        results_array = []
-        temp_dir = tempfile.mkdtemp()
+        image_names = [f"page_{page_index + 1}.jpg" for page_index in page_indexes]
+        detected_tables = table_detector.detect_tables_batch(file_paths, local=False, debug_dir=debug_dir, debug=debug,
+                                                             image_names=image_names)
+        return [cropped_tables or [] for cropped_tables in detected_tables]
 
-        for i, table in enumerate(cropped_tables):
-            table_index = f"page_{page_index + 1}_table_{i + 1}" if page_index is not None else f"table_{i + 1}"
-            print(f"Processing {table_index} for document {file_path}")
 
-            output_filename = os.path.join(temp_dir, f"{table_index}.jpg")
-            table.save(output_filename, "JPEG")
+    @staticmethod
+    def _detect_page_tables(file_path, debug, debug_dir, page_index=None):
+        """
+        Detects tables in a page and returns the cropped table images.
+        """
+        table_detector = TableDetector()
+        image_name = f"page_{page_index + 1}.jpg" if page_index is not None else None
+        cropped_tables = table_detector.detect_tables(file_path, local=False, debug_dir=debug_dir, debug=debug,
+                                                      image_name=image_name)
+        return cropped_tables or []
+
 
-            input_data[0]["file_path"] = [output_filename]
-            result = self._run_model_inference(model_inference_instance, input_data)
-            results_array.append(result)
+    def _infer_tables(self, model_inference_instance, cropped_tables, input_data, page_index=None):
+        """
+        Runs inference for the cropped tables of a page and merges the results into a single JSON string.
+        """
+        return self._infer_table_batch(model_inference_instance, [(page_index, cropped_tables)], input_data)
+
+
+    def _infer_table_batch(self, model_inference_instance, page_tables, input_data):
+        """
+        Runs inference for the cropped tables of several pages as one multi-image request, then re-associates
+        the results with their pages.
 
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        Args:
+            model_inference_instance: The model inference object.
+            page_tables: List of (page_index, cropped_tables) tuples. page_index is None for single images.
+            input_data: Input data for inference.
 
-        # Merge results_array elements into a single JSON structure
-        merged_results = {"page_tables": results_array}
+        Returns:
+            List with one JSON string per page, each holding the page's table results under "page_tables".
+        """
+        table_images = []
+        table_labels = []
+        for page_index, cropped_tables in page_tables:
+            for i, table in enumerate(cropped_tables):
+                table_images.append(table)
+                table_labels.append(f"page_{page_index + 1}_table_{i + 1}" if page_index is not None
+                                    else f"table_{i + 1}")
+
+        table_results = iter([])
+        if table_images:
+            print(f"Processing {len(table_images)} tables in one request: {', '.join(table_labels)}")
+
+            input_data[0]["file_path"] = table_images
+            table_results = iter([self._parse_table_result(result)
+                                  for result in model_inference_instance.inference(input_data)])
 
-        # Format the merged results as a JSON string with indentation
-        formatted_results = json.dumps(merged_results, indent=4)
+        results_array = []
+        for _, cropped_tables in page_tables:
+            # Merge the page's table results into a single JSON structure
+            merged_results = {"page_tables": [next(table_results) for _ in cropped_tables]}
+            results_array.append(json.dumps(merged_results, indent=4))
 
-        # Return the formatted JSON string wrapped in a list
-        return [formatted_results]
+        return results_array
 
 
     @staticmethod
-    def _run_model_inference(model_inference_instance, input_data):
+    def _parse_table_result(result):
         """
-        Runs model inference and handles JSON decoding.
+        Decodes the JSON result of a table.
         """
-        result = model_inference_instance.inference(input_data)[0]
         try:
             return json.loads(result) if isinstance(result, str) else result
         except json.JSONDecodeError:
@@ -186,8 +664,12 @@ class VLLMExtractor(object):
 
     @staticmethod
     def is_pdf(file_path):
-        """Checks if a file is a PDF based on its extension."""
-        return file_path.lower().endswith('.pdf')
+        """Checks if a file is a PDF based on its extension, or on its header for raw bytes."""
+        if isinstance(file_path, (bytes, bytearray)):
+            return bytes(file_path[:5]) == b"%PDF-"
+        if isinstance(file_path, str):
+            return file_path.lower().endswith('.pdf')
+        return False
 
 
 if __name__ == "__main__":
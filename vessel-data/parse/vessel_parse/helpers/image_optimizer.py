@@ -1,59 +1,295 @@
 from PIL import Image
+import numpy as np
+import io
 import os
 
 
 class ImageOptimizer(object):
+    # Largest share of content pixels for a page to be considered blank
+    BLANK_PAGE_MAX_CONTENT_RATIO = 0.001
+    # Margin kept around the content by crop_size="auto", as a share of the longer image side
+    AUTO_CROP_MARGIN_RATIO = 0.01
+
     def __init__(self):
         pass
 
-    def crop_image_borders(self, file_path, temp_dir, debug_dir=None, crop_size=60):
+    @staticmethod
+    def is_in_memory(source):
+        """
+        Checks if an image source is held in memory (PIL image or raw buffer) rather than a file path.
+        """
+        return isinstance(source, (Image.Image, bytes, bytearray, io.BytesIO))
+
+    @staticmethod
+    def load_image(source):
+        """
+        Opens an image from a file path, raw bytes, a BytesIO buffer or an already loaded PIL image.
+
+        Args:
+            source (str, bytes, io.BytesIO or PIL.Image.Image): Image source
+
+        Returns:
+            PIL.Image.Image: The image
+        """
+        if isinstance(source, Image.Image):
+            return source
+        if isinstance(source, (bytes, bytearray)):
+            return Image.open(io.BytesIO(source))
+        return Image.open(source)
+
+    @classmethod
+    def is_blank_page(cls, source, max_content_ratio=None, sample_width=400, margin_ratio=0.05, contrast=48):
+        """
+        Checks if a page is blank or near-empty, from the share of content pixels on a downsampled grayscale copy.
+
+        Content pixels are pixels that differ from the page background (the median gray level) by more than
+        `contrast`, so both dark ink on light paper and light text on a dark background count. Page margins are
+        ignored, as scanners leave dark edges and punch holes there.
+
+        Args:
+            source (str, bytes or PIL.Image.Image): The page image
+            max_content_ratio (float, optional): Largest share of content pixels for a blank page.
+                Defaults to BLANK_PAGE_MAX_CONTENT_RATIO
+            sample_width (int): Width of the downsampled copy the check runs on
+            margin_ratio (float): Share of the width and height ignored on each side
+            contrast (int): Minimum difference in gray levels from the background for a content pixel
+
+        Returns:
+            bool: True if the page has no meaningful content
+        """
+        max_content_ratio = cls.BLANK_PAGE_MAX_CONTENT_RATIO if max_content_ratio is None else max_content_ratio
+
+        image = cls.load_image(source)
+        # Box filtering averages thin strokes instead of dropping them
+        sample = image.convert("L")
+        sample.thumbnail((sample_width, sample_width * 4), Image.Resampling.BOX)
+        if image is not source:
+            image.close()
+
+        pixels = np.asarray(sample, dtype=np.int16)
+        height, width = pixels.shape
+        margin_y, margin_x = int(height * margin_ratio), int(width * margin_ratio)
+        pixels = pixels[margin_y:height - margin_y, margin_x:width - margin_x]
+        if pixels.size == 0:
+            return True
+
+        background = np.median(pixels)
+        content_ratio = np.count_nonzero(np.abs(pixels - background) > contrast) / pixels.size
+
+        return content_ratio <= max_content_ratio
+
+    @classmethod
+    def find_content_bbox(cls, source, sample_width=800, contrast=48, min_line_ratio=0.002, max_line_ratio=0.9):
+        """
+        Finds the bounding box of the page content from row and column projections of a downsampled grayscale copy.
+
+        Content pixels differ from the background (the median gray level) by more than `contrast`. A row or column
+        holds content when its share of content pixels is above min_line_ratio, which ignores scanner speckles,
+        and below max_line_ratio, which ignores solid dark bars left by scanners at the page edges.
+
+        Args:
+            source (str, bytes or PIL.Image.Image): The page image
+            sample_width (int): Width of the downsampled copy the projections run on
+            contrast (int): Minimum difference in gray levels from the background for a content pixel
+            min_line_ratio (float): Smallest share of content pixels for a row or column with content
+            max_line_ratio (float): Largest share of content pixels for a row or column with content
+
+        Returns:
+            tuple: (left, top, right, bottom) of the content in image pixels, or None for a blank page
+        """
+        image = cls.load_image(source)
+        width, height = image.size
+        sample = image.convert("L")
+        sample.thumbnail((sample_width, sample_width * 4), Image.Resampling.BOX)
+        if image is not source:
+            image.close()
+
+        pixels = np.asarray(sample, dtype=np.int16)
+        content = np.abs(pixels - np.median(pixels)) > contrast
+
+        row_ratios = content.mean(axis=1)
+        column_ratios = content.mean(axis=0)
+        rows = np.flatnonzero((row_ratios > min_line_ratio) & (row_ratios < max_line_ratio))
+        columns = np.flatnonzero((column_ratios > min_line_ratio) & (column_ratios < max_line_ratio))
+        if rows.size == 0 or columns.size == 0:
+            return None
+
+        # Scale back to image pixels, rounding outwards
+        scale_x = width / pixels.shape[1]
+        scale_y = height / pixels.shape[0]
+        return (int(columns[0] * scale_x), int(rows[0] * scale_y),
+                min(width, int(np.ceil((columns[-1] + 1) * scale_x))),
+                min(height, int(np.ceil((rows[-1] + 1) * scale_y))))
+
+    @classmethod
+    def perceptual_hash(cls, source, hash_size=16):
+        """
+        Computes the difference hash (dHash) of an image: the sign of the horizontal gradient on a
+        hash_size x hash_size grayscale thumbnail. Re-encoded or rescaled copies of a page get the same or a
+        nearby hash. In flat areas such as white margins neighbouring cells are nearly equal and scanner noise
+        flips their bits, so re-scans and re-sent faxes differ in a few bits: compare hashes by Hamming
+        distance against a threshold, not for equality.
+
+        Args:
+            source (str, bytes or PIL.Image.Image): The image
+            hash_size (int): Thumbnail size, the hash has hash_size * hash_size bits
+
+        Returns:
+            str: The hash as a hex string
+        """
+        image = cls.load_image(source)
+        sample = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+        if image is not source:
+            image.close()
+
+        pixels = np.asarray(sample, dtype=np.int16)
+        bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+        return np.packbits(bits).tobytes().hex()
+
+    @classmethod
+    def is_monochrome(cls, source, sample_width=200, tolerance=16):
+        """
+        Checks if an image has no meaningful color, as with black and white or grayscale scans saved as RGB.
+
+        Args:
+            source (str, bytes or PIL.Image.Image): The image
+            sample_width (int): Width of the downsampled copy used for the check
+            tolerance (int): Largest channel spread (0-255) of a pixel still considered gray, covers scanner
+                tint and JPEG chroma noise
+
+        Returns:
+            bool: True if the image can be converted to grayscale without losing content
+        """
+        image = cls.load_image(source)
+        if image.mode in ("1", "L", "LA", "I", "I;16", "F"):
+            if image is not source:
+                image.close()
+            return True
+
+        scale = min(1.0, sample_width / image.width)
+        sample = image.convert("RGB").resize((max(int(image.width * scale), 1), max(int(image.height * scale), 1)),
+                                             Image.Resampling.BOX)
+        if image is not source:
+            image.close()
+
+        pixels = np.asarray(sample, dtype=np.int16)
+        spread = pixels.max(axis=2) - pixels.min(axis=2)
+        # Allow a few colored pixels (stamps, signatures) below the 99.5th percentile
+        return float(np.percentile(spread, 99.5)) <= tolerance
+
+    @classmethod
+    def encode_image(cls, source, max_size=None, image_format="JPEG", quality=85, grayscale=False):
+        """
+        Encodes an image compactly for upload: resized to max_size, optionally converted to grayscale and
+        compressed as WebP or JPEG.
+
+        Args:
+            source (str, bytes or PIL.Image.Image): The image
+            max_size (tuple, optional): (width, height) to resize the image to. Images are never enlarged
+            image_format (str): "JPEG", "WEBP" or "PNG"
+            quality (int): Encoder quality for JPEG and WebP, 1-100
+            grayscale (bool or str): True to encode a single gray channel, "auto" to do so only for
+                monochrome images (see is_monochrome)
+
+        Returns:
+            bytes: The encoded image
         """
-        Crops all four borders of an image by the specified size.
+        image_format = image_format.upper()
+        if image_format == "JPG":
+            image_format = "JPEG"
+        if image_format not in ("JPEG", "WEBP", "PNG"):
+            raise ValueError(f"Unsupported image format: {image_format}")
+
+        image = cls.load_image(source)
+        if grayscale == "auto":
+            grayscale = cls.is_monochrome(image)
+        encoded = image.convert("L" if grayscale else "RGB")
+        if image is not source and encoded is not image:
+            image.close()
+
+        if max_size and (max_size[0] < encoded.width or max_size[1] < encoded.height):
+            encoded = encoded.resize((min(max_size[0], encoded.width), min(max_size[1], encoded.height)),
+                                     Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        if image_format == "PNG":
+            encoded.save(buffer, image_format, optimize=True)
+        elif image_format == "WEBP":
+            encoded.save(buffer, image_format, quality=quality, method=4)
+        else:
+            encoded.save(buffer, image_format, quality=quality, optimize=True)
+        return buffer.getvalue()
+
+    def crop_image_borders(self, file_path, temp_dir, debug_dir=None, crop_size=60, name=None):
+        """
+        Crops all four borders of an image by the specified size, or to the page content with crop_size="auto".
 
         Args:
-            file_path (str): Path to the input image
-            temp_dir (str): Temporary directory to store the cropped image
+            file_path (str, bytes or PIL.Image.Image): Path to the input image, or the image held in memory
+            temp_dir (str): Temporary directory to store the cropped image. When None, the cropped
+                image is returned in memory and nothing is written except the debug copy
             debug_dir (str, optional): Directory to save a debug copy of the cropped image
-            crop_size (int): Number of pixels to crop from each border
+            crop_size (int or str): Number of pixels to crop from each border, or "auto" to crop to the content
+                bounding box (see find_content_bbox) plus a margin of AUTO_CROP_MARGIN_RATIO. Blank pages are
+                left uncropped in auto mode
+            name (str, optional): Base file name for in-memory images, used for saved copies
 
         Returns:
-            str: Path to the cropped image in temp_dir
+            str or PIL.Image.Image: Path to the cropped image in temp_dir, or the cropped image when temp_dir is None
         """
         try:
             # Open the image
-            with Image.open(file_path) as img:
-                # Get image dimensions
-                width, height = img.size
+            img = self.load_image(file_path)
+
+            # Get image dimensions
+            width, height = img.size
 
-                # Calculate the crop box
+            # Calculate the crop box
+            if crop_size == "auto":
+                content_bbox = self.find_content_bbox(img) or (0, 0, width, height)
+                margin = int(max(width, height) * self.AUTO_CROP_MARGIN_RATIO)
+                left = max(content_bbox[0] - margin, 0)
+                top = max(content_bbox[1] - margin, 0)
+                right = min(content_bbox[2] + margin, width)
+                bottom = min(content_bbox[3] + margin, height)
+            else:
                 left = crop_size
                 top = crop_size
                 right = width - crop_size
                 bottom = height - crop_size
 
-                # Ensure we're not trying to crop more than the image size
-                if right <= left or bottom <= top:
-                    raise ValueError("Crop size is too large for the image dimensions")
+            # Ensure we're not trying to crop more than the image size
+            if right <= left or bottom <= top:
+                raise ValueError("Crop size is too large for the image dimensions")
 
-                # Perform the crop
-                cropped_img = img.crop((left, top, right, bottom))
+            # Perform the crop
+            cropped_img = img.crop((left, top, right, bottom))
 
-                # Get original filename without path
+            if img is not file_path:
+                img.close()
+
+            # Get original filename without path
+            if isinstance(file_path, str):
                 filename = os.path.basename(file_path)
-                name, ext = os.path.splitext(filename)
+            else:
+                filename = f"{name or 'image'}.jpg"
+            name, ext = os.path.splitext(filename)
+
+            # If debug_dir is provided, save a debug copy
+            if debug_dir:
+                os.makedirs(debug_dir, exist_ok=True)
+                debug_path = os.path.join(debug_dir, f"{name}_cropped_debug{ext}")
+                cropped_img.save(debug_path)
+                print(f"Debug cropped image saved to: {debug_path}")
 
-                # Save cropped image in temp_dir
-                output_path = os.path.join(temp_dir, f"{name}_cropped{ext}")
-                cropped_img.save(output_path)
+            if temp_dir is None:
+                return cropped_img
 
-                # If debug_dir is provided, save a debug copy
-                if debug_dir:
-                    os.makedirs(debug_dir, exist_ok=True)
-                    debug_path = os.path.join(debug_dir, f"{name}_cropped_debug{ext}")
-                    cropped_img.save(debug_path)
-                    print(f"Debug cropped image saved to: {debug_path}")
+            # Save cropped image in temp_dir
+            output_path = os.path.join(temp_dir, f"{name}_cropped{ext}")
+            cropped_img.save(output_path)
 
-                return output_path
+            return output_path
 
         except Exception as e:
-            raise Exception(f"Error processing image: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error processing image: {str(e)}")
@@ -0,0 +1,88 @@
+import json
+import re
+
+
+# Text allowed on a line before the JSON value starts: nothing, or an opening code fence such as ```json
+_VALUE_LINE_PREFIX = re.compile(r"\s*(```[\w-]*\s*)?")
+
+
+class JsonCompletionTracker(object):
+    """
+    Tracks generated text chunk by chunk and detects when the top-level JSON object or array is complete.
+
+    Brace/bracket depth and string state (including escapes) are updated incrementally, so each chunk is scanned
+    once. The value has to start a line or follow an opening code fence, so a bracket inside a preamble such as
+    "Here are the fields [see below]:" is not taken for it, and the closed span has to parse as JSON. A candidate
+    that does not parse is dropped and scanning goes on. Generation can stop as soon as the value closes,
+    instead of running on into closing code fences or trailing commentary.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.complete = False
+        self._in_string = False
+        self._escape = False
+        # Text of the current line before a value starts, and the chunks of the value once it has
+        self._line = ""
+        self._span = []
+
+    def feed(self, text):
+        """
+        Consumes the next chunk of generated text.
+
+        Args:
+            text (str): Newly generated text
+
+        Returns:
+            int: Position in text right after the closing bracket of the top-level value, or -1 while it is open
+        """
+        if self.complete:
+            return 0
+
+        span_start = 0
+        for i, char in enumerate(text):
+            if not self.started:
+                if char in "{[" and _VALUE_LINE_PREFIX.fullmatch(self._line):
+                    self.started = True
+                    self.depth = 1
+                    span_start = i
+                elif char == "\n":
+                    self._line = ""
+                else:
+                    self._line += char
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self._span.append(text[span_start:i + 1])
+                    if self._close_span():
+                        return i + 1
+
+        if self.started:
+            self._span.append(text[span_start:])
+        return -1
+
+    def _close_span(self):
+        """Checks the closed candidate value. Returns True if it is valid JSON, otherwise resets the tracker."""
+        try:
+            json.loads("".join(self._span))
+        except ValueError:
+            self.started = False
+            self._span = []
+            # Scanning resumes in the middle of a line
+            self._line = "]"
+            return False
+
+        self.complete = True
+        return True
@@ -0,0 +1,220 @@
+from PIL import Image
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class PageCache(object):
+    """
+    On-disk, content-addressed cache for rendered pages, table detection results and inference results.
+
+    Rendered pages are keyed by (document hash, page number, DPI, crop size), table detection results
+    by the hash of the page image and inference results by a key computed by the caller. Entries are evicted
+    least recently used first once the cache grows beyond max_size_bytes. Hit and miss counters are kept
+    per entry kind.
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, cache_dir, max_size_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.counters = {"page_hits": 0, "page_misses": 0, "table_hits": 0, "table_misses": 0,
+                         "result_hits": 0, "result_misses": 0}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(cache_dir, "pages"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "tables"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "results"), exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    @classmethod
+    def get_default(cls):
+        """
+        Returns the process-wide cache configured with the VESSEL_CACHE_DIR and VESSEL_CACHE_MAX_MB
+        environment variables, or None when caching is not configured.
+        """
+        cache_dir = os.getenv("VESSEL_CACHE_DIR")
+        if not cache_dir:
+            return None
+
+        with cls._default_lock:
+            if cls._default is None or cls._default.cache_dir != cache_dir:
+                max_size_mb = int(os.getenv("VESSEL_CACHE_MAX_MB", "2048"))
+                cls._default = cls(cache_dir, max_size_bytes=max_size_mb * 1024 * 1024)
+            return cls._default
+
+    @staticmethod
+    def hash_document(source):
+        """Returns the content hash of a document given as a file path or raw bytes."""
+        digest = hashlib.blake2b(digest_size=20)
+        if isinstance(source, (bytes, bytearray)):
+            digest.update(source)
+        else:
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def hash_image(image):
+        """Returns the content hash of a PIL image's pixels."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{image.mode}:{image.size}".encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def has_page(self, document_hash, page_number, dpi, crop_size=None):
+        """
+        Checks if a page is cached, without loading it. An absent page counts as a miss, since it is rendered
+        instead of read with get_page. Hits are counted by get_page.
+        """
+        if os.path.exists(self._page_path(document_hash, page_number, dpi, crop_size)):
+            return True
+        self._count("page_misses")
+        return False
+
+    def get_page(self, document_hash, page_number, dpi, crop_size=None):
+        """Returns the cached page image, or None on a miss."""
+        path = self._page_path(document_hash, page_number, dpi, crop_size)
+        if not os.path.exists(path):
+            self._count("page_misses")
+            return None
+
+        try:
+            with Image.open(path) as cached:
+                image = cached.convert("RGB")
+        except OSError:
+            # Entry evicted or partially written by another process
+            self._count("page_misses")
+            return None
+
+        self._touch(path)
+        self._count("page_hits")
+        return image
+
+    def put_page(self, document_hash, page_number, dpi, crop_size, image):
+        """
+        Stores a rendered page image. Pages are stored losslessly, so a cached page has the same pixels as the
+        freshly rendered one and the table and result caches, keyed by pixel hash, hit on a retry.
+        """
+        path = self._page_path(document_hash, page_number, dpi, crop_size)
+        self._write(path, lambda f: image.save(f, "PNG", compress_level=1))
+
+    def get_tables(self, image_hash):
+        """Returns the cached table detection objects for a page image, or None on a miss."""
+        path = os.path.join(self.cache_dir, "tables", f"{image_hash}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                objects = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._count("table_misses")
+            return None
+
+        self._touch(path)
+        self._count("table_hits")
+        return objects
+
+    def put_tables(self, image_hash, objects):
+        """Stores the table detection objects for a page image."""
+        path = os.path.join(self.cache_dir, "tables", f"{image_hash}.json")
+        self._write(path, lambda f: f.write(json.dumps(objects).encode("utf-8")))
+
+    def get_result(self, key, ttl_seconds=None):
+        """
+        Returns the cached inference result for a key, or None on a miss or when the entry is older than ttl_seconds.
+        """
+        path = os.path.join(self.cache_dir, "results", f"{key}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._count("result_misses")
+            return None
+
+        # Recency is tracked by modification time, the age of a result by its creation time
+        if ttl_seconds is not None and time.time() - entry["created"] > ttl_seconds:
+            self._count("result_misses")
+            return None
+
+        self._touch(path)
+        self._count("result_hits")
+        return entry["result"]
+
+    def put_result(self, key, result):
+        """Stores an inference result."""
+        path = os.path.join(self.cache_dir, "results", f"{key}.json")
+        entry = {"created": time.time(), "result": result}
+        self._write(path, lambda f: f.write(json.dumps(entry).encode("utf-8")))
+
+    def stats(self):
+        """Returns the hit/miss counters and the current cache size in bytes."""
+        with self._lock:
+            return dict(self.counters, size_bytes=self._size)
+
+    def _page_path(self, document_hash, page_number, dpi, crop_size):
+        key = f"{document_hash}_p{page_number}_d{dpi}_c{crop_size or 0}"
+        return os.path.join(self.cache_dir, "pages", f"{key}.png")
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    @staticmethod
+    def _touch(path):
+        # Modification time is the recency used for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _write(self, path, write_call):
+        # Write to a temporary file first so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write_call(f)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        with self._lock:
+            self._size += os.path.getsize(path) - old_size
+            if self._size > self.max_size_bytes:
+                self._evict()
+
+    def _entries(self):
+        for kind in ("pages", "tables", "results"):
+            directory = os.path.join(self.cache_dir, kind)
+            for name in os.listdir(directory):
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def _evict(self):
+        """Removes least recently used entries until the cache is below 90% of its size limit."""
+        target = self.max_size_bytes * 0.9
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+
+        # Re-measure, other processes may share the directory
+        self._size = sum(size for _, _, size in entries)
+
+        for path, _, size in entries:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                continue
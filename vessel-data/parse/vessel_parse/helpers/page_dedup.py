@@ -0,0 +1,107 @@
+from vessel_parse.helpers.image_optimizer import ImageOptimizer
+from vessel_parse.helpers.page_cache import PageCache
+from collections import OrderedDict
+import threading
+
+
+class PageDeduplicator(object):
+    """
+    Per-process index of inference results keyed by the perceptual hash of a page, the prompt and the model.
+
+    Repeated pages (re-sent cover sheets, duplicated faxes, the same terms and conditions page at the back of
+    every statement) are inferred once and the result is reused for every duplicate, within a document and
+    across the documents processed by the same process.
+
+    The index is shared across documents, so a result is only reused for a page with the same pixels: two
+    filled-in copies of a template form have nearly the same perceptual hash but must not share an extraction.
+    The perceptual hash finds the candidates, a content hash of the pixels confirms them. Near-duplicate
+    matching (max_distance > 0 without verify_pixels) is opt-in, for workloads where pages that look alike
+    are known to carry the same data.
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, max_entries=1024, hash_size=16, max_distance=0, verify_pixels=True):
+        """
+        :param max_entries: Number of results kept in the index, least recently used entries are dropped first.
+        :param hash_size: dHash thumbnail size, larger sizes tell apart pages that differ in smaller details.
+        :param max_distance: Largest number of differing perceptual hash bits for two pages to be candidates.
+        :param verify_pixels: Only treat candidates as duplicates when their pixels are identical.
+        """
+        self.max_entries = max_entries
+        self.hash_size = hash_size
+        self.max_distance = max_distance
+        self.verify_pixels = verify_pixels
+        self.counters = {"hits": 0, "misses": 0}
+        self._results = OrderedDict()
+        # Keys of the pages seen, with their perceptual hash as an integer for the distance checks
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_default(cls):
+        """Returns the process-wide index."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def page_key(self, page, prompt, model_id=None):
+        """
+        Returns the index key of a page for a prompt and model.
+
+        :param page: The page image, as a file path, raw bytes or an in-memory PIL image.
+        :param prompt: The query sent with the page, including the schema, or any hashable value that scopes the result.
+        :param model_id: Identifies the model and backend, results of different models are not shared.
+        :return: The key of the nearest duplicate already seen, or a new key.
+        """
+        image = ImageOptimizer.load_image(page)
+        try:
+            page_hash = ImageOptimizer.perceptual_hash(image, self.hash_size)
+            content_hash = PageCache.hash_image(image.convert("RGB")) if self.verify_pixels else None
+        finally:
+            if image is not page:
+                image.close()
+        hash_value = int(page_hash, 16)
+
+        with self._lock:
+            nearest, nearest_distance = None, self.max_distance + 1
+            for key, known_value in self._keys.items():
+                if key[1:] != (content_hash, prompt, model_id):
+                    continue
+                distance = bin(hash_value ^ known_value).count("1")
+                if distance < nearest_distance:
+                    nearest, nearest_distance = key, distance
+
+            if nearest is None:
+                nearest = (page_hash, content_hash, prompt, model_id)
+                self._keys[nearest] = hash_value
+            self._keys.move_to_end(nearest)
+            while len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+            return nearest
+
+    def get(self, key):
+        """Returns the result stored for a key, or None."""
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.counters["misses"] += 1
+                return None
+
+            self._results.move_to_end(key)
+            self.counters["hits"] += 1
+            return result
+
+    def put(self, key, result):
+        """Stores the result for a key."""
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def stats(self):
+        """Returns the hit/miss counters and the number of stored results."""
+        with self._lock:
+            return dict(self.counters, entries=len(self._results))
@@ -0,0 +1,48 @@
+def parse_page_selection(pages, number_of_pages=None):
+    """
+    Parses a page selection into a sorted list of unique 1-based page numbers.
+
+    Args:
+        pages (str, int or list): Page ranges and explicit pages, e.g. "3-5,7", [3, 4, 5, 7] or ["3-5", "7"].
+            None or an empty selection selects all pages
+        number_of_pages (int, optional): Number of pages in the document, used to validate the selection
+
+    Returns:
+        list: Selected page numbers, or None when all pages are selected
+
+    Raises:
+        ValueError: If the selection is malformed or refers to pages outside the document
+    """
+    if pages is None:
+        return None
+
+    if isinstance(pages, int):
+        items = [str(pages)]
+    elif isinstance(pages, str):
+        items = pages.split(",")
+    else:
+        items = [str(item) for item in pages]
+
+    selected = set()
+    for item in items:
+        item = item.strip()
+        if not item:
+            continue
+
+        try:
+            if "-" in item:
+                start, end = item.split("-", 1)
+                start, end = int(start), int(end)
+            else:
+                start = end = int(item)
+        except ValueError:
+            raise ValueError(f"Invalid page selection: '{item}'. Use page numbers and ranges, e.g. 3-5,7")
+
+        if start < 1 or end < start:
+            raise ValueError(f"Invalid page range: '{item}'")
+        if number_of_pages is not None and end > number_of_pages:
+            raise ValueError(f"Page selection '{item}' is out of range, document has {number_of_pages} pages")
+
+        selected.update(range(start, end + 1))
+
+    return sorted(selected) or None
@@ -1,13 +1,31 @@
 import pypdf
-from pdf2image import convert_from_path
+from vessel_parse.helpers.pdf_renderer import get_renderer
+from vessel_parse.helpers.image_optimizer import ImageOptimizer
+from vessel_parse.helpers.page_cache import PageCache
+import io
 import os
 import tempfile
 import shutil
 
 
 class PDFOptimizer(object):
-    def __init__(self):
-        pass
+    # Rasterization resolution when no target image size is given. crop_size is expressed in pixels at this DPI.
+    DEFAULT_DPI = 300
+    # Minimum number of non-whitespace characters for a page's text layer to be used instead of its image
+    MIN_TEXT_LAYER_CHARS = 100
+    # Minimum share of readable characters in a text layer. Broken font encodings extract as control
+    # characters or replacement characters, those pages go through vision inference instead
+    MIN_TEXT_LAYER_READABLE_RATIO = 0.9
+
+    def __init__(self, renderer=None, cache=None):
+        """
+        :param renderer: PDFRenderer used for rasterization. Defaults to get_renderer(),
+            which prefers the in-process pdfium backend and falls back to poppler.
+        :param cache: PageCache for rendered pages. Defaults to PageCache.get_default(),
+            which is enabled by the VESSEL_CACHE_DIR environment variable.
+        """
+        self.renderer = renderer or get_renderer()
+        self.cache = cache if cache is not None else PageCache.get_default()
 
     def split_pdf_to_pages(self, file_path, debug_dir=None, convert_to_images=False):
         # Create a temporary directory
@@ -39,25 +57,206 @@ class PDFOptimizer(object):
             # Return the number of pages, the list of file paths, and the temporary directory
             return number_of_pages, output_files, temp_dir
         else:
-            # Convert the PDF to images
-            images = convert_from_path(file_path, dpi=300)
+            # Render the pages in fixed-size windows, keeping only the file paths
+            output_files = list(self.stream_pdf_to_images(file_path, temp_dir, debug_dir))
+
+            # Return the number of pages, the list of file paths, and the temporary directory
+            return len(output_files), output_files, temp_dir
+
+    @staticmethod
+    def get_page_count(file_path):
+        """
+        Returns the number of pages in a PDF file (path or raw bytes) without rendering it.
+        """
+        if isinstance(file_path, (bytes, bytearray)):
+            return len(pypdf.PdfReader(io.BytesIO(file_path)).pages)
+
+        with open(file_path, 'rb') as pdf_file:
+            reader = pypdf.PdfReader(pdf_file)
+            return len(reader.pages)
+
+    @classmethod
+    def extract_text_layer(cls, file_path, page_numbers=None, min_chars=None):
+        """
+        Extracts the text layer of digital-born PDF pages, keeping the page layout.
+
+        Args:
+            file_path (str or bytes): Path to the input PDF or raw PDF content
+            page_numbers (list, optional): 1-based page numbers to extract. Defaults to all pages
+            min_chars (int, optional): Minimum number of non-whitespace characters for a usable text layer.
+                Defaults to MIN_TEXT_LAYER_CHARS
+
+        Returns:
+            dict: Page number to layout text, or to None when the page has no usable text layer (e.g. scanned pages)
+        """
+        min_chars = cls.MIN_TEXT_LAYER_CHARS if min_chars is None else min_chars
+        source = io.BytesIO(file_path) if isinstance(file_path, (bytes, bytearray)) else file_path
+
+        reader = pypdf.PdfReader(source)
+        page_numbers = page_numbers or list(range(1, len(reader.pages) + 1))
+
+        page_texts = {}
+        for page_num in page_numbers:
+            try:
+                text = reader.pages[page_num - 1].extract_text(extraction_mode="layout")
+            except Exception:
+                # Malformed content streams are left to vision inference
+                text = None
+            page_texts[page_num] = text if cls._is_usable_text_layer(text, min_chars) else None
+
+        return page_texts
+
+    @classmethod
+    def _is_usable_text_layer(cls, text, min_chars):
+        if not text:
+            return False
+
+        characters = [char for char in text if not char.isspace()]
+        if len(characters) < min_chars:
+            return False
+
+        readable = sum(1 for char in characters if char.isprintable() and char != "\ufffd")
+        return readable / len(characters) >= cls.MIN_TEXT_LAYER_READABLE_RATIO
+
+    @staticmethod
+    def get_page_sizes(file_path):
+        """
+        Returns the (width, height) in points of each page as it is rendered, from the page's crop box
+        (which defaults to the media box) and taking the page rotation into account.
+        """
+        if isinstance(file_path, (bytes, bytearray)):
+            reader = pypdf.PdfReader(io.BytesIO(file_path))
+            return [PDFOptimizer._rendered_page_size(page) for page in reader.pages]
+
+        with open(file_path, 'rb') as pdf_file:
+            reader = pypdf.PdfReader(pdf_file)
+            return [PDFOptimizer._rendered_page_size(page) for page in reader.pages]
+
+    @staticmethod
+    def _rendered_page_size(page):
+        width, height = float(page.cropbox.width), float(page.cropbox.height)
+        if page.rotation % 180 == 90:
+            width, height = height, width
+        return width, height
+
+    @classmethod
+    def fit_dpi(cls, page_size, max_size, crop_size=None):
+        """
+        Returns the highest DPI, up to DEFAULT_DPI, at which a page fits in max_size pixels
+        once its borders are cropped.
+
+        Args:
+            page_size (tuple): (width, height) of the page in points
+            max_size (tuple): (max_width, max_height) of the image accepted by the model
+            crop_size (int or str, optional): Border crop in pixels at DEFAULT_DPI. With "auto" the content size is
+                only known after rendering, so the page is fitted as a whole
+
+        Returns:
+            int: Rendering resolution for the page
+        """
+        width_pt, height_pt = page_size
+        max_width, max_height = max_size
+        fixed_crop_size = crop_size if isinstance(crop_size, int) else 0
+        crop_pt = 2 * fixed_crop_size * 72 / cls.DEFAULT_DPI
+
+        content_width = max(width_pt - crop_pt, 1)
+        content_height = max(height_pt - crop_pt, 1)
+
+        dpi = min(cls.DEFAULT_DPI, max_width * 72 / content_width, max_height * 72 / content_height)
+        return max(int(dpi), 1)
+
+    def stream_pdf_to_images(self, file_path, temp_dir=None, debug_dir=None, window_size=4, crop_size=None,
+                             max_size=None, page_numbers=None):
+        """
+        Renders PDF pages and yields each page as soon as it is ready.
+
+        Pages are rendered in windows of `window_size` pages by the configured renderer,
+        so peak memory depends on the window size and not on the length of the document.
+        Pages found in the page cache are not rendered again.
+
+        Args:
+            file_path (str or bytes): Path to the input PDF or raw PDF content
+            temp_dir (str, optional): Directory to store the rendered pages as JPEG files. When None,
+                pages are yielded as in-memory PIL images and nothing is written except debug copies
+            debug_dir (str, optional): Directory to save a debug copy of each page
+            window_size (int): Maximum number of rendered pages held in memory at once
+            crop_size (int or str, optional): Number of pixels to crop from each border of the rendered pages,
+                at DEFAULT_DPI. The crop is scaled with the page DPI. "auto" crops each page to its content
+            max_size (tuple, optional): (max_width, max_height) of the images accepted by the model. When set,
+                each page is rendered at the DPI that makes it fit, instead of rendering at DEFAULT_DPI
+                and downscaling later
+            page_numbers (list, optional): 1-based page numbers to render. Defaults to all pages
+
+        Yields:
+            str or PIL.Image.Image: Path to the rendered page in temp_dir, or the page image, in page order
+        """
+        if isinstance(file_path, str):
             base_name = os.path.splitext(os.path.basename(file_path))[0]
+        else:
+            base_name = "document"
 
-            # Save the images to the temporary directory
-            for i, image in enumerate(images):
-                output_filename = os.path.join(temp_dir, f'{base_name}_page_{i + 1}.jpg')
-                image.save(output_filename, 'JPEG')
-                output_files.append(output_filename)
+        if max_size:
+            page_sizes = self.get_page_sizes(file_path)
+            page_numbers = page_numbers or list(range(1, len(page_sizes) + 1))
+            dpi = {page_num: self.fit_dpi(page_sizes[page_num - 1], max_size, crop_size) for page_num in page_numbers}
+        else:
+            page_numbers = page_numbers or list(range(1, self.get_page_count(file_path) + 1))
+            dpi = {page_num: self.DEFAULT_DPI for page_num in page_numbers}
 
-                if debug_dir:
-                    # Save each image to the debug folder
-                    os.makedirs(debug_dir, exist_ok=True)
-                    debug_output_filename = os.path.join(debug_dir, f'{base_name}_page_{i + 1}_debug.jpg')
-                    image.save(debug_output_filename, 'JPEG')
-                    print(f"Debug image saved to: {debug_output_filename}")
+        document_hash = None
+        cached_page_numbers = set()
+        if self.cache is not None:
+            document_hash = self.cache.hash_document(file_path)
+            cached_page_numbers = {page_num for page_num in page_numbers
+                                   if self.cache.has_page(document_hash, page_num, dpi[page_num], crop_size)}
 
-            # Return the number of pages, the list of file paths, and the temporary directory
-            return len(images), output_files, temp_dir
+        pages_to_render = [page_num for page_num in page_numbers if page_num not in cached_page_numbers]
+        rendered_pages = self.renderer.iter_pages(file_path, pages_to_render, dpi=dpi, window_size=window_size)
+
+        for page_num in page_numbers:
+            if page_num in cached_page_numbers:
+                image = self.cache.get_page(document_hash, page_num, dpi[page_num], crop_size)
+                if image is None:
+                    # Evicted since the lookup, render this page on its own
+                    _, image = next(self.renderer.iter_pages(file_path, [page_num], dpi=dpi, window_size=1))
+                    image = self._crop_and_cache(image, document_hash, page_num, dpi[page_num], crop_size)
+            else:
+                _, image = next(rendered_pages)
+                image = self._crop_and_cache(image, document_hash, page_num, dpi[page_num], crop_size)
+
+            if debug_dir:
+                # Save each image to the debug folder
+                os.makedirs(debug_dir, exist_ok=True)
+                debug_output_filename = os.path.join(debug_dir, f'{base_name}_page_{page_num}_debug.jpg')
+                image.save(debug_output_filename, 'JPEG')
+                print(f"Debug image saved to: {debug_output_filename}")
+
+            if temp_dir is None:
+                yield image
+                continue
+
+            output_filename = os.path.join(temp_dir, f'{base_name}_page_{page_num}.jpg')
+            image.save(output_filename, 'JPEG')
+            image.close()
+
+            yield output_filename
+
+    def _crop_and_cache(self, image, document_hash, page_num, dpi, crop_size):
+        """
+        Crops the borders of a freshly rendered page, if requested, and stores it in the page cache.
+        """
+        if crop_size == "auto":
+            image = ImageOptimizer().crop_image_borders(image, None, None, crop_size)
+        elif crop_size:
+            # crop_size is given at DEFAULT_DPI, keep the same physical border at the page DPI
+            scaled_crop_size = max(int(round(crop_size * dpi / self.DEFAULT_DPI)), 1)
+            image = ImageOptimizer().crop_image_borders(image, None, None, scaled_crop_size)
+        if self.cache is not None:
+            # Cached pages are read back as RGB, pass the same pixels downstream on the first run
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            self.cache.put_page(document_hash, page_num, dpi, crop_size, image)
+        return image
 
 
 if __name__ == "__main__":
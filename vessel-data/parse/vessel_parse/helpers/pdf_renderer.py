@@ -0,0 +1,199 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, wait
+from collections import deque
+from pdf2image import convert_from_path, convert_from_bytes
+import multiprocessing
+import os
+import tempfile
+import threading
+import uuid
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+
+class PDFRenderer(ABC):
+    """
+    Renders PDF pages to PIL images. The source can be a file path or the raw PDF bytes.
+    """
+
+    @abstractmethod
+    def iter_pages(self, source, page_numbers, dpi=300, window_size=4):
+        """
+        Renders the given pages and yields them in page order.
+
+        Args:
+            source (str or bytes): Path to the PDF or raw PDF content
+            page_numbers (list): 1-based page numbers to render
+            dpi (int or dict): Rendering resolution, or a mapping of page number to resolution
+            window_size (int): Maximum number of rendered pages held in memory at once
+
+        Yields:
+            tuple: (page_number, PIL.Image)
+        """
+        pass
+
+    def render_pages(self, source, page_numbers, dpi=300):
+        """Renders the given pages and returns the images as a list, in page order."""
+        return [image for _, image in self.iter_pages(source, page_numbers, dpi, window_size=len(page_numbers) or 1)]
+
+    @staticmethod
+    def _page_dpi(dpi, page_number):
+        return dpi[page_number] if isinstance(dpi, dict) else dpi
+
+    def _page_windows(self, page_numbers, window_size, dpi=300):
+        """Splits page numbers into windows of consecutive pages with the same DPI, at most window_size long."""
+        windows = []
+        for page_number in page_numbers:
+            if (windows and len(windows[-1]) < window_size and windows[-1][-1] == page_number - 1
+                    and self._page_dpi(dpi, windows[-1][-1]) == self._page_dpi(dpi, page_number)):
+                windows[-1].append(page_number)
+            else:
+                windows.append([page_number])
+        return windows
+
+
+class PopplerRenderer(PDFRenderer):
+    """
+    Renders pages through pdf2image and the poppler command line tools.
+    Parallelism comes from pdf2image's thread_count, which splits each window across poppler processes.
+    """
+
+    def __init__(self, thread_count=None):
+        self.thread_count = thread_count or os.cpu_count() or 1
+
+    def iter_pages(self, source, page_numbers, dpi=300, window_size=4):
+        for window in self._page_windows(page_numbers, window_size, dpi):
+            kwargs = {
+                "dpi": self._page_dpi(dpi, window[0]),
+                "first_page": window[0],
+                "last_page": window[-1],
+                "thread_count": min(self.thread_count, len(window))
+            }
+            if isinstance(source, (bytes, bytearray)):
+                images = convert_from_bytes(source, **kwargs)
+            else:
+                images = convert_from_path(source, **kwargs)
+
+            for page_number in window:
+                # Release each page as soon as it is consumed
+                yield page_number, images.pop(0)
+
+
+_worker_document = None
+
+
+def _render_pdfium_page(document_path, document_key, page_number, dpi):
+    """
+    Renders a page in a worker process. The worker keeps the last document open, so the pages of a document
+    only open it once per worker.
+    """
+    global _worker_document
+    if _worker_document is None or _worker_document[0] != document_key:
+        if _worker_document is not None:
+            _worker_document[1].close()
+        _worker_document = (document_key, pdfium.PdfDocument(document_path))
+
+    page = _worker_document[1][page_number - 1]
+    try:
+        return page.render(scale=dpi / 72).to_pil()
+    finally:
+        page.close()
+
+
+class PdfiumRenderer(PDFRenderer):
+    """
+    Renders pages in-process with the pdfium bindings (pypdfium2), without poppler subprocesses or PPM files.
+    PDFium is not thread-safe, so pages are rendered in parallel across a process pool. The pool is started
+    once per process and shared by all documents. Its workers are spawned, not forked: the parent may hold
+    torch or MLX state and running threads, which do not survive fork.
+    """
+    _executors = {}
+    _executors_lock = threading.Lock()
+
+    def __init__(self, max_workers=None):
+        if pdfium is None:
+            raise ImportError("pypdfium2 is required for PdfiumRenderer. Install it with: pip install pypdfium2")
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    @classmethod
+    def _get_executor(cls, max_workers):
+        """Returns the process-wide render pool with max_workers workers, started on first use."""
+        with cls._executors_lock:
+            executor = cls._executors.get(max_workers)
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=max_workers,
+                                               mp_context=multiprocessing.get_context("spawn"))
+                cls._executors[max_workers] = executor
+            return executor
+
+    def iter_pages(self, source, page_numbers, dpi=300, window_size=4):
+        if isinstance(source, bytearray):
+            source = bytes(source)
+
+        if min(self.max_workers, window_size, len(page_numbers)) <= 1:
+            # A single page does not pay for a round trip to the pool
+            document = pdfium.PdfDocument(source)
+            try:
+                for page_number in page_numbers:
+                    page = document[page_number - 1]
+                    yield page_number, page.render(scale=self._page_dpi(dpi, page_number) / 72).to_pil()
+                    page.close()
+            finally:
+                document.close()
+            return
+
+        temp_path = None
+        if isinstance(source, bytes):
+            # Workers open the document from a file, instead of receiving its bytes with every page
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
+                temp_file.write(source)
+                temp_path = temp_file.name
+        document_path = temp_path or os.path.abspath(source)
+        # New for every call, a worker never reuses a document opened for another call
+        document_key = uuid.uuid4().hex
+
+        executor = self._get_executor(self.max_workers)
+        pending = deque()
+        try:
+            # Keep at most window_size pages in flight, yielding in page order
+            for page_number in page_numbers:
+                pending.append((page_number, executor.submit(_render_pdfium_page, document_path, document_key,
+                                                             page_number, self._page_dpi(dpi, page_number))))
+                if len(pending) >= window_size:
+                    done_page, future = pending.popleft()
+                    yield done_page, future.result()
+
+            while pending:
+                done_page, future = pending.popleft()
+                yield done_page, future.result()
+        finally:
+            # The consumer may stop early, drop the pages it will not take
+            for _, future in pending:
+                future.cancel()
+            if temp_path is not None:
+                # Pages still rendering need their file
+                wait([future for _, future in pending])
+                os.remove(temp_path)
+
+
+def get_renderer(name=None):
+    """
+    Returns a PDF renderer instance.
+
+    Args:
+        name (str, optional): 'pdfium' or 'poppler'. Defaults to the VESSEL_PDF_RENDERER environment variable,
+            then to pdfium when pypdfium2 is installed and poppler otherwise.
+    """
+    name = (name or os.getenv("VESSEL_PDF_RENDERER", "")).lower()
+
+    if name == "poppler":
+        return PopplerRenderer()
+    if name == "pdfium":
+        return PdfiumRenderer()
+    if name:
+        raise ValueError(f"Unknown PDF renderer: {name}")
+
+    return PdfiumRenderer() if pdfium is not None else PopplerRenderer()
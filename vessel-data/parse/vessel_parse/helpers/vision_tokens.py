@@ -0,0 +1,42 @@
+import math
+
+
+# Qwen2/2.5-VL encodes 14x14 pixel patches and merges 2x2 of them into one visual token,
+# so each 28x28 pixel block of the resized image costs one token
+PATCH_SIZE = 28
+
+
+def count_visual_tokens(width, height, patch_size=PATCH_SIZE):
+    """
+    Returns the number of visual tokens for an image of the given size, once it is snapped to patch multiples.
+    """
+    return max(width // patch_size, 1) * max(height // patch_size, 1)
+
+
+def fit_token_budget(width, height, max_tokens=None, max_size=None, patch_size=PATCH_SIZE):
+    """
+    Returns the image size to send to the model: the original aspect ratio scaled down to fit a visual token
+    budget and a maximum size, with both dimensions snapped down to multiples of the patch size.
+
+    Args:
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+        max_tokens (int, optional): Largest number of visual tokens for the image. None leaves the token count
+            bounded by max_size only
+        max_size (tuple, optional): (max_width, max_height) in pixels
+        patch_size (int): Pixel size of the square block encoded as one visual token
+
+    Returns:
+        tuple: (new_width, new_height, tokens)
+    """
+    scale = 1.0
+    if max_size:
+        scale = min(scale, max_size[0] / width, max_size[1] / height)
+    if max_tokens:
+        scale = min(scale, math.sqrt(max_tokens * patch_size * patch_size / (width * height)))
+
+    # Snap down so the budget and the maximum size always hold
+    new_width = max(int(width * scale) // patch_size, 1) * patch_size
+    new_height = max(int(height * scale) // patch_size, 1) * patch_size
+
+    return new_width, new_height, count_visual_tokens(new_width, new_height, patch_size)
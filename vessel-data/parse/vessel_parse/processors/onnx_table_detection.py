@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+from transformers import AutoConfig, AutoModelForObjectDetection
+from transformers.utils import ModelOutput
+from rich import print
+import argparse
+import torch
+import os
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+
+ONNX_MODEL_FILE = "model.onnx"
+
+
+@dataclass
+class TableDetectionOutput(ModelOutput):
+    logits: torch.FloatTensor = None
+    pred_boxes: torch.FloatTensor = None
+
+
+class OnnxTableDetectionModel(object):
+    """
+    Runs the exported table detection graph with ONNX Runtime on CPU.
+
+    Called like the eager model, with pixel_values and pixel_mask tensors, and returns logits and
+    pred_boxes as torch tensors, so TableDetector post-processing is shared by both backends.
+    The model directory is produced by export_table_detection_model and is loaded without hub access.
+    """
+
+    def __init__(self, model_dir, num_threads=None):
+        """
+        :param model_dir: Directory with model.onnx and the model config.
+        :param num_threads: Threads used inside each operator. Defaults to ONNX Runtime's choice.
+        """
+        if ort is None:
+            raise ImportError("onnxruntime is required for the ONNX table detection backend. "
+                              "Install it with: pip install onnxruntime")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+
+        self.session = ort.InferenceSession(os.path.join(model_dir, ONNX_MODEL_FILE), options,
+                                            providers=["CPUExecutionProvider"])
+        self.config = AutoConfig.from_pretrained(model_dir, local_files_only=True)
+
+    def to(self, device):
+        # The session runs on CPU, kept for interface compatibility with the eager model
+        return self
+
+    def __call__(self, pixel_values, pixel_mask=None):
+        if pixel_mask is None:
+            pixel_mask = torch.ones((pixel_values.shape[0],) + tuple(pixel_values.shape[2:]), dtype=torch.long)
+
+        logits, pred_boxes = self.session.run(["logits", "pred_boxes"], {
+            "pixel_values": pixel_values.cpu().numpy(),
+            "pixel_mask": pixel_mask.cpu().numpy()
+        })
+
+        return TableDetectionOutput(logits=torch.from_numpy(logits), pred_boxes=torch.from_numpy(pred_boxes))
+
+
+def export_table_detection_model(output_dir, model_name="microsoft/table-transformer-detection", revision="no_timm",
+                                 opset_version=17, check=True):
+    """
+    Exports the table detection model once to ONNX, next to its eager weights and config.
+
+    Batch size, height and width are dynamic, so batched and single-page detection use the same graph.
+    Both backends can then load from output_dir without downloading from the hub.
+
+    :param output_dir: Directory to write model.onnx, the weights and the config to.
+    :param check: Verify that the exported graph matches the eager model, see check_parity.
+    :return: Path to the exported model.onnx.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    model = AutoModelForObjectDetection.from_pretrained(model_name, revision=revision)
+    model.eval()
+    model.save_pretrained(output_dir)
+
+    # Outputs are returned as a tuple while tracing, keep only logits and pred_boxes
+    class ExportWrapper(torch.nn.Module):
+        def __init__(self, wrapped_model):
+            super().__init__()
+            self.wrapped_model = wrapped_model
+
+        def forward(self, pixel_values, pixel_mask):
+            outputs = self.wrapped_model(pixel_values=pixel_values, pixel_mask=pixel_mask)
+            return outputs.logits, outputs.pred_boxes
+
+    pixel_values = torch.randn(1, 3, 800, 600)
+    pixel_mask = torch.ones(1, 800, 600, dtype=torch.long)
+    onnx_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            ExportWrapper(model),
+            (pixel_values, pixel_mask),
+            onnx_path,
+            input_names=["pixel_values", "pixel_mask"],
+            output_names=["logits", "pred_boxes"],
+            dynamic_axes={
+                "pixel_values": {0: "batch", 2: "height", 3: "width"},
+                "pixel_mask": {0: "batch", 1: "height", 2: "width"},
+                "logits": {0: "batch"},
+                "pred_boxes": {0: "batch"}
+            },
+            opset_version=opset_version
+        )
+
+    print(f"Table detection model exported to: {onnx_path}")
+
+    if check:
+        check_parity(output_dir, model)
+
+    return onnx_path
+
+
+def check_parity(model_dir, eager_model=None, atol=1e-3, num_threads=None):
+    """
+    Compares the ONNX graph with the eager model on a padded batch of two random inputs of different sizes.
+
+    :param model_dir: Directory produced by export_table_detection_model.
+    :param eager_model: Eager model to compare with. Defaults to the weights saved in model_dir.
+    :param atol: Largest allowed absolute difference of logits and boxes.
+    :return: Dict with the largest absolute difference of the logits and of the boxes.
+    :raises ValueError: When a difference is above atol.
+    """
+    if eager_model is None:
+        eager_model = AutoModelForObjectDetection.from_pretrained(model_dir, local_files_only=True)
+    eager_model.eval()
+
+    onnx_model = OnnxTableDetectionModel(model_dir, num_threads)
+
+    generator = torch.Generator().manual_seed(0)
+    pixel_values = torch.randn(2, 3, 800, 640, generator=generator)
+    pixel_mask = torch.ones(2, 800, 640, dtype=torch.long)
+    # Second image is smaller and padded, as in TableDetector.prepare_images
+    pixel_values[1, :, 600:, :] = 0
+    pixel_values[1, :, :, 500:] = 0
+    pixel_mask[1, 600:, :] = 0
+    pixel_mask[1, :, 500:] = 0
+
+    with torch.no_grad():
+        expected = eager_model(pixel_values=pixel_values, pixel_mask=pixel_mask)
+    actual = onnx_model(pixel_values, pixel_mask)
+
+    differences = {
+        "logits": float((expected.logits - actual.logits).abs().max()),
+        "pred_boxes": float((expected.pred_boxes - actual.pred_boxes).abs().max())
+    }
+    print("ONNX parity check, largest absolute differences:", differences)
+
+    if max(differences.values()) > atol:
+        raise ValueError(f"ONNX table detection model does not match the eager model: {differences}")
+
+    return differences
+
+
+if __name__ == "__main__":
+    # run locally: python -m vessel_parse.processors.onnx_table_detection --output-dir models/table-detection
+    parser = argparse.ArgumentParser(description="Export the table detection model to ONNX")
+    parser.add_argument("--output-dir", required=True, help="Directory for model.onnx, weights and config")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+    parser.add_argument("--skip-check", action="store_true", help="Skip the parity check against the eager model")
+    args = parser.parse_args()
+
+    export_table_detection_model(args.output_dir, opset_version=args.opset, check=not args.skip_check)
@@ -0,0 +1,159 @@
+from concurrent.futures import ProcessPoolExecutor
+from vessel_parse.helpers.image_optimizer import ImageOptimizer
+from rich import print
+import multiprocessing
+import argparse
+import resource
+import sys
+import time
+
+
+# Detection threshold used when cropping tables, see TableDetector.crop_tables
+SCORE_THRESHOLD = 0.5
+
+
+def _peak_rss_bytes():
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def _run_detector(quantize, image_paths, repeats):
+    """
+    Loads the detector in a fresh process and runs it on the sample pages. Each variant gets its own
+    process, so peak resident memory is measured for that variant alone.
+    """
+    from vessel_parse.processors.table_structure_processor import TableDetector
+
+    rss_before_load = _peak_rss_bytes()
+    model, device = TableDetector.load_table_detection_model(quantize=quantize, device="cpu")
+    model_rss = _peak_rss_bytes() - rss_before_load
+
+    detector = TableDetector()
+    images = [ImageOptimizer.load_image(image_path).convert("RGB") for image_path in image_paths]
+
+    # Warm-up pass, the first forward pass includes one-off allocations
+    detector.prepare_images(images[:1], model, device)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        page_objects = [detector.identify_tables(model, detector.prepare_images([image], model, device), image)
+                        for image in images]
+    seconds_per_page = (time.perf_counter() - start) / (repeats * len(images))
+
+    tables = [[obj for obj in objects if obj["score"] >= SCORE_THRESHOLD]
+              for objects in page_objects]
+
+    return {
+        "tables": tables,
+        "seconds_per_page": seconds_per_page,
+        "model_rss_bytes": model_rss,
+        "peak_rss_bytes": _peak_rss_bytes()
+    }
+
+
+def box_iou(box_a, box_b):
+    """Intersection over union of two [x0, y0, x1, y1] boxes."""
+    inter_width = max(0.0, min(box_a[2], box_b[2]) - max(box_a[0], box_b[0]))
+    inter_height = max(0.0, min(box_a[3], box_b[3]) - max(box_a[1], box_b[1]))
+    intersection = inter_width * inter_height
+
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    union = area_a + area_b - intersection
+
+    return intersection / union if union > 0 else 0.0
+
+
+def compare_tables(reference_tables, candidate_tables, iou_threshold=0.5):
+    """
+    Matches each reference table with the best overlapping candidate table of the same label.
+
+    :return: Dict with the IoU of every reference table, and the number of matched, missed and extra tables.
+    """
+    ious = []
+    matched_candidates = set()
+
+    for reference in reference_tables:
+        best_iou, best_index = 0.0, None
+        for i, candidate in enumerate(candidate_tables):
+            if i in matched_candidates or candidate["label"] != reference["label"]:
+                continue
+            iou = box_iou(reference["bbox"], candidate["bbox"])
+            if iou > best_iou:
+                best_iou, best_index = iou, i
+
+        ious.append(best_iou)
+        if best_index is not None and best_iou >= iou_threshold:
+            matched_candidates.add(best_index)
+
+    matched = sum(1 for iou in ious if iou >= iou_threshold)
+    return {
+        "ious": ious,
+        "matched": matched,
+        "missed": len(reference_tables) - matched,
+        "extra": len(candidate_tables) - len(matched_candidates)
+    }
+
+
+def check_quantization(image_paths, repeats=3, iou_threshold=0.5):
+    """
+    Compares the dynamic int8 quantized table detector with fp32 on CPU, on sample pages.
+
+    Reports the IoU of the detected tables against fp32, and the detection time and resident memory of
+    both variants, each measured in its own process.
+
+    :param image_paths: Sample page images.
+    :param repeats: Number of timed passes over the pages.
+    :param iou_threshold: IoU above which a quantized table counts as matching the fp32 one.
+    :return: Dict with the fp32 and int8 measurements and the accuracy comparison.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for name, quantize in (("fp32", False), ("int8", True)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[name] = executor.submit(_run_detector, quantize, image_paths, repeats).result()
+
+    ious = []
+    matched = missed = extra = 0
+    for page_path, reference, candidate in zip(image_paths, results["fp32"]["tables"], results["int8"]["tables"]):
+        comparison = compare_tables(reference, candidate, iou_threshold)
+        ious.extend(comparison["ious"])
+        matched += comparison["matched"]
+        missed += comparison["missed"]
+        extra += comparison["extra"]
+        print(f"{page_path}: {len(reference)} fp32 tables, {len(candidate)} int8 tables, "
+              f"IoU {[round(iou, 3) for iou in comparison['ious']]}")
+
+    report = {
+        "fp32": {key: value for key, value in results["fp32"].items() if key != "tables"},
+        "int8": {key: value for key, value in results["int8"].items() if key != "tables"},
+        "mean_iou": sum(ious) / len(ious) if ious else None,
+        "min_iou": min(ious) if ious else None,
+        "matched": matched,
+        "missed": missed,
+        "extra": extra
+    }
+
+    fp32, int8 = report["fp32"], report["int8"]
+    print(f"Tables matched: {matched}, missed: {missed}, extra: {extra}, "
+          f"mean IoU: {report['mean_iou']}, min IoU: {report['min_iou']}")
+    print(f"Detection time per page: fp32 {fp32['seconds_per_page']:.3f}s, int8 {int8['seconds_per_page']:.3f}s "
+          f"({fp32['seconds_per_page'] / int8['seconds_per_page']:.2f}x)")
+    print(f"Model resident memory: fp32 {fp32['model_rss_bytes'] / 2 ** 20:.0f} MB, "
+          f"int8 {int8['model_rss_bytes'] / 2 ** 20:.0f} MB")
+    print(f"Peak resident memory: fp32 {fp32['peak_rss_bytes'] / 2 ** 20:.0f} MB, "
+          f"int8 {int8['peak_rss_bytes'] / 2 ** 20:.0f} MB")
+
+    return report
+
+
+if __name__ == "__main__":
+    # run locally: python -m vessel_parse.processors.table_detection_quantization page_1.png page_2.png
+    parser = argparse.ArgumentParser(description="Compare int8 quantized table detection with fp32 on CPU")
+    parser.add_argument("images", nargs="+", help="Sample page images")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes over the pages")
+    parser.add_argument("--iou-threshold", type=float, default=0.5, help="IoU for a table to count as matched")
+    args = parser.parse_args()
+
+    check_quantization(args.images, repeats=args.repeats, iou_threshold=args.iou_threshold)
@@ -2,17 +2,26 @@ from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich import print
 from transformers import AutoModelForObjectDetection
 import torch
-from PIL import Image
+import numpy as np
 from torchvision import transforms
+from vessel_parse.helpers.image_optimizer import ImageOptimizer
+from vessel_parse.helpers.page_cache import PageCache
+from vessel_parse.processors.onnx_table_detection import OnnxTableDetectionModel
 import os
 
 
 class TableDetector(object):
     _model = None  # Static variable to hold the table detection model
     _device = None  # Static variable to hold the device information
+    # Number of pages stacked into one forward pass by detect_tables_batch
+    BATCH_SIZE = 8
 
-    def __init__(self):
-        pass
+    def __init__(self, cache=None):
+        """
+        :param cache: PageCache for table detection results. Defaults to PageCache.get_default(),
+            which is enabled by the VESSEL_CACHE_DIR environment variable.
+        """
+        self.cache = cache if cache is not None else PageCache.get_default()
 
     class MaxResize(object):
         def __init__(self, max_size=800):
@@ -41,66 +50,187 @@ class TableDetector(object):
             print("Table detection model initialized.")
 
 
-    def detect_tables(self, file_path, local=True, debug_dir=None, debug=False):
-        # Ensure the model is initialized using invoke_pipeline_step
-        self._initialize_model(self.invoke_pipeline_step, local)
+    def detect_tables(self, file_path, local=True, debug_dir=None, debug=False, image_name=None):
+        """
+        Detects tables in an image and returns them as cropped PIL images.
 
-        # Use the static model and device
-        model, device = self._model, self._device
+        file_path can be a file path, raw bytes or a PIL image. image_name is used to name
+        debug copies of in-memory images.
+        """
+        return self.detect_tables_batch([file_path], local, debug_dir, debug, [image_name])[0]
 
-        outputs, image = self.invoke_pipeline_step(
-            lambda: self.prepare_image(file_path, model, device),
-            "Preparing image for table detection...",
-            local
-        )
 
-        objects = self.invoke_pipeline_step(
-            lambda: self.identify_tables(model, outputs, image),
-            "Identifying tables in the image...",
-            local
-        )
+    def detect_tables_batch(self, file_paths, local=True, debug_dir=None, debug=False, image_names=None):
+        """
+        Detects tables in several images with batched forward passes and returns the cropped tables per image.
+
+        Up to BATCH_SIZE images are resized, padded to a common size and stacked into one tensor, with a pixel
+        mask marking the padding, and run through the model in a single torch.no_grad() pass. Images found in the
+        cache are not run through the model.
+
+        :param file_paths: Images as file paths, raw bytes or PIL images.
+        :param image_names: Names used for debug copies of in-memory images, one per image.
+        :return: List with the cropped table images of each image, or None for images without tables.
+        """
+        image_names = image_names or [None] * len(file_paths)
+        cropped_tables = []
 
-        cropped_tables = self.invoke_pipeline_step(
-            lambda: self.crop_tables(file_path, image, objects, debug, debug_dir),
-            "Cropping tables from the image...",
-            local
-        )
+        for start in range(0, len(file_paths), self.BATCH_SIZE):
+            batch = file_paths[start:start + self.BATCH_SIZE]
+            batch_names = image_names[start:start + self.BATCH_SIZE]
+            debug_names = [file_path if isinstance(file_path, str) else image_name or "image.jpg"
+                           for file_path, image_name in zip(batch, batch_names)]
+
+            images = [ImageOptimizer.load_image(file_path).convert("RGB") for file_path in batch]
+
+            # Detection results are cached by page image content
+            image_hashes = [self.cache.hash_image(image) if self.cache is not None else None for image in images]
+            batch_objects = [self.cache.get_tables(image_hash) if image_hash else None for image_hash in image_hashes]
+
+            detect_indexes = [i for i, objects in enumerate(batch_objects) if objects is None]
+            if detect_indexes:
+                # Ensure the model is initialized using invoke_pipeline_step
+                self._initialize_model(self.invoke_pipeline_step, local)
+
+                # Use the static model and device
+                model, device = self._model, self._device
+                detect_images = [images[i] for i in detect_indexes]
+
+                outputs = self.invoke_pipeline_step(
+                    lambda: self.prepare_images(detect_images, model, device),
+                    f"Preparing {len(detect_images)} images for table detection...",
+                    local
+                )
+
+                detected_objects = self.invoke_pipeline_step(
+                    lambda: [self.identify_tables(model, self.slice_outputs(outputs, i), image)
+                             for i, image in enumerate(detect_images)],
+                    "Identifying tables in the images...",
+                    local
+                )
+
+                for i, objects in zip(detect_indexes, detected_objects):
+                    batch_objects[i] = objects
+                    if image_hashes[i]:
+                        self.cache.put_tables(image_hashes[i], objects)
+
+            for i, (debug_name, image, objects) in enumerate(zip(debug_names, images, batch_objects)):
+                if debug and i not in detect_indexes:
+                    print("Table detection results loaded from cache for:", debug_name)
+
+                cropped_tables.append(self.invoke_pipeline_step(
+                    lambda: self.crop_tables(debug_name, image, objects, debug, debug_dir),
+                    "Cropping tables from the image...",
+                    local
+                ))
 
         return cropped_tables
 
 
     @staticmethod
-    def load_table_detection_model():
-        model = AutoModelForObjectDetection.from_pretrained("microsoft/table-transformer-detection", revision="no_timm")
+    def load_table_detection_model(quantize=None, device=None):
+        """
+        Loads the table detection model and returns it with its device.
+
+        VESSEL_TABLE_DETECTION_BACKEND selects 'torch' (default, eager PyTorch) or 'onnx' (the exported graph
+        on ONNX Runtime, CPU only). VESSEL_TABLE_DETECTION_MODEL_DIR points to a directory written by
+        vessel_parse.processors.onnx_table_detection, so the model loads without a hub download; it is required
+        for the ONNX backend. VESSEL_TABLE_DETECTION_THREADS sets the CPU thread count of either backend.
+
+        :param quantize: Apply dynamic int8 quantization to the linear layers when the eager model runs on CPU.
+            Defaults to the VESSEL_TABLE_DETECTION_QUANTIZE environment variable. See
+            vessel_parse.processors.table_detection_quantization for the accuracy, speed and memory check.
+        :param device: Device for the eager model. Defaults to CUDA when available, CPU otherwise.
+        """
+        if quantize is None:
+            quantize = os.getenv("VESSEL_TABLE_DETECTION_QUANTIZE", "").lower() in ("1", "true", "yes")
+
+        backend = os.getenv("VESSEL_TABLE_DETECTION_BACKEND", "torch").lower()
+        model_dir = os.getenv("VESSEL_TABLE_DETECTION_MODEL_DIR")
+        num_threads = int(os.getenv("VESSEL_TABLE_DETECTION_THREADS", "0")) or None
+
+        if backend == "onnx":
+            if not model_dir:
+                raise ValueError("VESSEL_TABLE_DETECTION_MODEL_DIR must point to an exported model "
+                                 "for the ONNX table detection backend")
+            if quantize:
+                print("Table detection quantization applies to the torch backend only, running the ONNX graph as exported.")
+            return OnnxTableDetectionModel(model_dir, num_threads), "cpu"
+        if backend != "torch":
+            raise ValueError(f"Unknown table detection backend: {backend}")
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        if model_dir:
+            model = AutoModelForObjectDetection.from_pretrained(model_dir, local_files_only=True)
+        else:
+            model = AutoModelForObjectDetection.from_pretrained("microsoft/table-transformer-detection",
+                                                                revision="no_timm")
 
-        device = "cuda" if torch.cuda.is_available() else "cpu"
+        device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         model.to(device)
 
+        if quantize:
+            if device == "cpu":
+                model = TableDetector.quantize_model(model)
+            else:
+                print(f"Table detection quantization is CPU only, running fp32 on {device}.")
+
         return model, device
 
+    @staticmethod
+    def quantize_model(model):
+        """
+        Applies dynamic int8 quantization to the linear layers of the model (the transformer encoder/decoder
+        and prediction heads). Weights are stored in int8 and activations are quantized on the fly, which
+        shrinks the model in memory and speeds up CPU inference. The convolutional backbone stays fp32.
+        """
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
 
     def prepare_image(self, file_path, model, device):
-        image = Image.open(file_path).convert("RGB")
+        image = ImageOptimizer.load_image(file_path).convert("RGB")
+        outputs = self.prepare_images([image], model, device)
+
+        return outputs, image
 
+    def prepare_images(self, images, model, device):
+        """
+        Runs the detection model on several images in one forward pass. Resized images are padded at the bottom
+        and right to the largest size in the batch, the pixel mask keeps the padding out of the predictions,
+        so boxes stay relative to each image.
+        """
         detection_transform = transforms.Compose([
             self.MaxResize(800),
             transforms.ToTensor(),
             transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
         ])
 
-        pixel_values = detection_transform(image).unsqueeze(0)
-        pixel_values = pixel_values.to(device)
+        tensors = [detection_transform(image) for image in images]
+        max_height = max(tensor.shape[1] for tensor in tensors)
+        max_width = max(tensor.shape[2] for tensor in tensors)
+
+        pixel_values = torch.zeros((len(tensors), 3, max_height, max_width), dtype=tensors[0].dtype)
+        pixel_mask = torch.zeros((len(tensors), max_height, max_width), dtype=torch.long)
+        for i, tensor in enumerate(tensors):
+            _, height, width = tensor.shape
+            pixel_values[i, :, :height, :width] = tensor
+            pixel_mask[i, :height, :width] = 1
 
         with torch.no_grad():
-            outputs = model(pixel_values)
+            outputs = model(pixel_values.to(device), pixel_mask=pixel_mask.to(device))
 
-        return outputs, image
+        return outputs
 
-    def identify_tables(self, model, outputs, image):
-        id2label = model.config.id2label
-        id2label[len(model.config.id2label)] = "no object"
+    @staticmethod
+    def slice_outputs(outputs, index):
+        """Returns the model outputs of one image of a batch, keeping the batch dimension."""
+        return type(outputs)(logits=outputs.logits[index:index + 1], pred_boxes=outputs.pred_boxes[index:index + 1])
 
-        objects = self.outputs_to_objects(outputs, image.size, id2label)
+    def identify_tables(self, model, outputs, image):
+        # The shared model config is only read, "no object" predictions are dropped by class index
+        objects = self.outputs_to_objects(outputs, image.size, model.config.id2label)
         return objects
 
 
@@ -161,19 +291,16 @@ class TableDetector(object):
 
     def outputs_to_objects(self, outputs, img_size, id2label):
         m = outputs.logits.softmax(-1).max(-1)
-        pred_labels = list(m.indices.detach().cpu().numpy())[0]
-        pred_scores = list(m.values.detach().cpu().numpy())[0]
-        pred_bboxes = outputs['pred_boxes'].detach().cpu()[0]
-        pred_bboxes = [elem.tolist() for elem in self.rescale_bboxes(pred_bboxes, img_size)]
-
-        objects = []
-        for label, score, bbox in zip(pred_labels, pred_scores, pred_bboxes):
-            class_label = id2label[int(label)]
-            if not class_label == 'no object':
-                objects.append({'label': class_label, 'score': float(score),
-                                'bbox': [float(elem) for elem in bbox]})
+        pred_labels = m.indices.detach().cpu()[0]
+        pred_scores = m.values.detach().cpu()[0]
 
-        return objects
+        # DETR predicts an extra last class for "no object"
+        keep = pred_labels != outputs.logits.shape[-1] - 1
+        pred_bboxes = self.rescale_bboxes(outputs['pred_boxes'].detach().cpu()[0][keep], img_size)
+
+        return [{'label': id2label[label], 'score': score, 'bbox': bbox}
+                for label, score, bbox in zip(pred_labels[keep].tolist(), pred_scores[keep].tolist(),
+                                              pred_bboxes.tolist())]
 
     def objects_to_crops(self, img, tokens, objects, class_thresholds, padding=10):
         """
@@ -181,19 +308,26 @@ class TableDetector(object):
         cropped table images and cropped tokens.
         """
 
-        table_crops = []
-        for obj in objects:
-            if obj['score'] < class_thresholds[obj['label']]:
-                continue
+        if not objects:
+            return []
 
-            cropped_table = {}
+        # Threshold and pad all boxes at once. Boxes are not clamped to the page: PIL fills the area
+        # outside the image, which keeps crops of tables at the page edge unchanged
+        scores = np.array([obj['score'] for obj in objects])
+        thresholds = np.array([class_thresholds[obj['label']] for obj in objects])
+        keep = scores >= thresholds
+        padded_bboxes = np.array([obj['bbox'] for obj in objects])[keep] + np.array([-padding, -padding,
+                                                                                      padding, padding])
+        token_bboxes = np.array([token['bbox'] for token in tokens], dtype=float).reshape(-1, 4)
 
-            bbox = obj['bbox']
-            bbox = [bbox[0] - padding, bbox[1] - padding, bbox[2] + padding, bbox[3] + padding]
+        table_crops = []
+        for obj, bbox in zip([obj for obj, kept in zip(objects, keep) if kept], padded_bboxes.tolist()):
+            cropped_table = {}
 
             cropped_img = img.crop(bbox)
 
-            table_tokens = [token for token in tokens if self.iob(token['bbox'], bbox) >= 0.5]
+            token_mask = self.iob(token_bboxes, bbox) >= 0.5
+            table_tokens = [token for token, inside in zip(tokens, token_mask) if inside]
             for token in table_tokens:
                 token['bbox'] = [token['bbox'][0] - bbox[0],
                                  token['bbox'][1] - bbox[1],
@@ -228,21 +362,24 @@ class TableDetector(object):
 
     @staticmethod
     def iob(boxA, boxB):
+        # Boxes are [x0, y0, x1, y1], boxA can also be an (N, 4) array to compute N ratios at once
+        boxA = np.asarray(boxA, dtype=float)
+        boxB = np.asarray(boxB, dtype=float)
+
         # Determine the coordinates of the intersection rectangle
-        xA = max(boxA[0], boxB[0])
-        yA = max(boxA[1], boxB[1])
-        xB = min(boxA[2], boxB[2])
-        yB = min(boxA[3], boxB[3])
+        xA = np.maximum(boxA[..., 0], boxB[..., 0])
+        yA = np.maximum(boxA[..., 1], boxB[..., 1])
+        xB = np.minimum(boxA[..., 2], boxB[..., 2])
+        yB = np.minimum(boxA[..., 3], boxB[..., 3])
 
         # Compute the area of intersection rectangle
-        interArea = max(0, xB - xA + 1) * max(0, yB - yA + 1)
+        interArea = np.maximum(0, xB - xA + 1) * np.maximum(0, yB - yA + 1)
 
-        # Compute the area of both the prediction and ground-truth rectangles
-        boxAArea = (boxA[2] - boxA[0] + 1) * (boxA[3] - boxA[1] + 1)
-        boxBArea = (boxB[2] - boxB[0] + 1) * (boxB[3] - boxB[1] + 1)
+        # Compute the area of the box
+        boxAArea = (boxA[..., 2] - boxA[..., 0] + 1) * (boxA[..., 3] - boxA[..., 1] + 1)
 
         # Compute the intersection over box (IoB)
-        iob = interArea / float(boxAArea)
+        iob = interArea / boxAArea
 
         return iob
 
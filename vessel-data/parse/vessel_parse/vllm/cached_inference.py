@@ -0,0 +1,186 @@
+from vessel_parse.vllm.inference_base import ModelInference
+from vessel_parse.helpers.image_optimizer import ImageOptimizer
+from vessel_parse.helpers.page_cache import PageCache
+from collections import OrderedDict
+from rich import print
+import asyncio
+import hashlib
+import json
+import os
+import threading
+
+
+class CachedInference(ModelInference):
+    """
+    Result cache in front of a ModelInference backend.
+
+    Results are keyed by (image content hash, text_input, model, generation parameters), so re-submitting
+    a document or re-running a flow returns the stored results instead of generating again. Lookups go
+    to a per-process memory LRU first, then to the on-disk PageCache when one is configured (VESSEL_CACHE_DIR).
+    Disk entries expire after ttl_seconds. Only the images that miss both tiers are sent to the backend.
+    """
+    _memory = OrderedDict()
+    _memory_lock = threading.Lock()
+    _counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def __init__(self, backend, cache=None, memory_entries=256, ttl_seconds=None):
+        """
+        :param backend: The wrapped ModelInference instance.
+        :param cache: PageCache used as the disk tier. Defaults to PageCache.get_default().
+        :param memory_entries: Number of results kept in the memory tier, shared by all instances in the process.
+        :param ttl_seconds: Age after which disk entries are ignored. Defaults to the VESSEL_RESULT_CACHE_TTL
+            environment variable, or 7 days.
+        """
+        self.backend = backend
+        self.cache = cache if cache is not None else PageCache.get_default()
+        self.memory_entries = memory_entries
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv("VESSEL_RESULT_CACHE_TTL",
+                                                                                     7 * 24 * 3600))
+
+    @property
+    def max_image_size(self):
+        return self.backend.max_image_size
+
+    @property
+    def generation_params(self):
+        return self.backend.generation_params
+
+    @property
+    def model_id(self):
+        return self.backend.model_id
+
+    @property
+    def token_callback(self):
+        return self.backend.token_callback
+
+    @token_callback.setter
+    def token_callback(self, callback):
+        # Cached results are returned without tokens, only generated pages stream
+        self.backend.token_callback = callback
+
+    def inference(self, input_data, mode=None):
+        if mode == "static":
+            return self.backend.inference(input_data, mode)
+
+        images = input_data[0]["file_path"]
+        keys = [self._result_key("image", self._image_hash(image), input_data[0]["text_input"]) for image in images]
+
+        return self._cached_call(keys, images, lambda missing: self.backend.inference(
+            [dict(input_data[0], file_path=missing)], mode))
+
+    def text_inference(self, input_data, mode=None):
+        if mode == "static":
+            return self.backend.text_inference(input_data, mode)
+
+        page_texts = input_data[0]["page_text"]
+        keys = [self._result_key("text", hashlib.blake2b(page_text.encode("utf-8"), digest_size=20).hexdigest(),
+                                 input_data[0]["text_input"]) for page_text in page_texts]
+
+        return self._cached_call(keys, page_texts, lambda missing: self.backend.text_inference(
+            [dict(input_data[0], page_text=missing)], mode))
+
+    async def ainference(self, input_data, mode=None):
+        if mode == "static":
+            return await self.backend.ainference(input_data, mode)
+
+        images = input_data[0]["file_path"]
+        # Hashing decodes every image, keep it off the event loop
+        keys = await asyncio.to_thread(lambda: [
+            self._result_key("image", self._image_hash(image), input_data[0]["text_input"]) for image in images])
+
+        return await self._acached_call(keys, images, lambda missing: self.backend.ainference(
+            [dict(input_data[0], file_path=missing)], mode))
+
+    async def atext_inference(self, input_data, mode=None):
+        if mode == "static":
+            return await self.backend.atext_inference(input_data, mode)
+
+        page_texts = input_data[0]["page_text"]
+        keys = [self._result_key("text", hashlib.blake2b(page_text.encode("utf-8"), digest_size=20).hexdigest(),
+                                 input_data[0]["text_input"]) for page_text in page_texts]
+
+        return await self._acached_call(keys, page_texts, lambda missing: self.backend.atext_inference(
+            [dict(input_data[0], page_text=missing)], mode))
+
+    @classmethod
+    def stats(cls):
+        """Returns the memory hit, disk hit and miss counters of the process."""
+        with cls._memory_lock:
+            return dict(cls._counters, memory_entries=len(cls._memory))
+
+    def _cached_call(self, keys, items, backend_call):
+        """
+        Looks up every key, calls the backend once with the items that missed, and returns the results in order.
+        """
+        results, missing_indexes = self._lookup_all(keys)
+        if missing_indexes:
+            self._store_missing(keys, results, missing_indexes, backend_call([items[i] for i in missing_indexes]))
+        return results
+
+    async def _acached_call(self, keys, items, backend_call):
+        """
+        Async version of _cached_call, backend_call returns an awaitable. Disk lookups and writes run in the
+        default executor.
+        """
+        results, missing_indexes = await asyncio.to_thread(self._lookup_all, keys)
+        if missing_indexes:
+            backend_results = await backend_call([items[i] for i in missing_indexes])
+            await asyncio.to_thread(self._store_missing, keys, results, missing_indexes, backend_results)
+        return results
+
+    def _lookup_all(self, keys):
+        results = [self._lookup(key) for key in keys]
+        missing_indexes = [i for i, result in enumerate(results) if result is None]
+
+        if len(missing_indexes) < len(keys):
+            print(f"Result cache: {len(keys) - len(missing_indexes)} of {len(keys)} results reused")
+
+        return results, missing_indexes
+
+    def _store_missing(self, keys, results, missing_indexes, backend_results):
+        for i, result in zip(missing_indexes, backend_results):
+            results[i] = result
+            self._store(keys[i], result)
+
+    def _result_key(self, kind, content_hash, text_input):
+        key_data = json.dumps([kind, content_hash, text_input, self.model_id, self.generation_params],
+                              sort_keys=True, default=str)
+        return hashlib.blake2b(key_data.encode("utf-8"), digest_size=20).hexdigest()
+
+    @staticmethod
+    def _image_hash(image):
+        # Hash decoded pixels, so the same page hits whether it is passed as a file or in memory
+        loaded = ImageOptimizer.load_image(image)
+        try:
+            return PageCache.hash_image(loaded.convert("RGB"))
+        finally:
+            if loaded is not image:
+                loaded.close()
+
+    def _lookup(self, key):
+        with self._memory_lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return self._memory[key]
+
+        result = self.cache.get_result(key, self.ttl_seconds) if self.cache is not None else None
+        with self._memory_lock:
+            if result is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+        self._remember(key, result)
+        return result
+
+    def _store(self, key, result):
+        self._remember(key, result)
+        if self.cache is not None:
+            self.cache.put_result(key, result)
+
+    def _remember(self, key, result):
+        with self._memory_lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
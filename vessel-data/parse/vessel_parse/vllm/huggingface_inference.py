@@ -1,14 +1,66 @@
 from gradio_client import Client, handle_file
 from vessel_parse.vllm.inference_base import ModelInference
+from vessel_parse.helpers.image_optimizer import ImageOptimizer
+from vessel_parse.helpers.vision_tokens import fit_token_budget
+from rich import print
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
 import json
 import os
 import ast
+import shutil
+import tempfile
+import threading
 
 
 class HuggingFaceInference(ModelInference):
-    def __init__(self, hf_space, hf_token):
+    # The Space resizes every page to fit 1250x1750 before inference
+    max_image_size = (1250, 1750)
+    # Set by the Space, see infra/qwen2_vl_7b/app.py
+    generation_params = {"max_new_tokens": 4096}
+    # Upload encoding, file extension by format
+    UPLOAD_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+    # Idle gradio clients by (space, token), shared by all instances in the process. Connecting a client
+    # fetches the Space config, reusing it saves that round trip on every call
+    _clients = {}
+    _clients_lock = threading.Lock()
+    # Whether each (space, token) serves /run_text_inference, looked up once per process
+    _text_endpoints = {}
+
+    def __init__(self, hf_space, hf_token, max_image_tokens=None, upload_format="JPEG", upload_quality=85,
+                 upload_grayscale="auto", max_concurrency=1):
+        """
+        :param hf_space: Space name (e.g. "vesselgpt/vessel-qwen2-vl-7b") or the URL of a Gradio app serving
+            the same endpoints, e.g. a local stand-in (infra/stub_space/app.py).
+        :param hf_token: Hugging Face token.
+        :param max_image_tokens: Visual token budget per image.
+        :param upload_format: Upload encoder, "JPEG", "WEBP" or "PNG".
+        :param upload_quality: JPEG/WebP quality.
+        :param upload_grayscale: True, False or "auto" to send monochrome pages as grayscale.
+        :param max_concurrency: Requests sent to the Space at the same time. Above 1, pages are split into
+            one request each, results are merged back in page order.
+        """
         self.hf_space = hf_space
         self.hf_token = hf_token
+        self.max_concurrency = max(int(max_concurrency or 1), 1)
+        # Visual token budget per image, applied by the Space when it resizes the image
+        self.max_image_tokens = max_image_tokens
+        # Images are resized to what the Space would use and re-encoded before upload
+        self.upload_format = upload_format.upper().replace("JPG", "JPEG")
+        if self.upload_format not in self.UPLOAD_EXTENSIONS:
+            raise ValueError(f"Unsupported upload format: {upload_format}")
+        self.upload_quality = upload_quality
+        self.upload_grayscale = upload_grayscale
+        # Bytes uploaded by the last inference call
+        self.bytes_sent = 0
+
+
+    @property
+    def model_id(self):
+        if self.max_image_tokens:
+            return f"huggingface:{self.hf_space}:{self.max_image_tokens}"
+        return f"huggingface:{self.hf_space}"
 
 
     def process_response(self, output_text):
@@ -26,35 +78,213 @@ class HuggingFaceInference(ModelInference):
             return output_text
 
 
-    def inference(self, input_data, mode=None):
-        if mode == "static":
-            simple_json = self.get_simple_json()
-            return [simple_json]
+    def _pop_client(self):
+        """Returns an idle client from the pool, or None."""
+        with self._clients_lock:
+            idle = self._clients.setdefault((self.hf_space, self.hf_token), [])
+            return idle.pop() if idle else None
+
+
+    def _return_client(self, client):
+        with self._clients_lock:
+            self._clients[(self.hf_space, self.hf_token)].append(client)
+
+
+    @contextmanager
+    def _client(self):
+        """
+        Yields a connected gradio client from the pool, or a new one when all pooled clients are in use.
+        Clients are returned to the pool only when the request succeeds.
+        """
+        client = self._pop_client() or Client(self.hf_space, hf_token=self.hf_token)
+        yield client
+        self._return_client(client)
+
+
+    async def _apredict(self, request):
+        """
+        Sends a request without blocking the event loop and returns the parsed result list. The gradio job
+        runs on the client's own threads and is awaited as a future.
+        """
+        client = self._pop_client() or await asyncio.to_thread(Client, self.hf_space, hf_token=self.hf_token)
+        results = await asyncio.wrap_future(client.submit(**request))
+        self._return_client(client)
+        return ast.literal_eval(results)
+
+
+    def _fan_out(self, items, predict):
+        """
+        Calls predict on items, the whole list in one request or one item per request with up to
+        max_concurrency requests in flight. Returns the merged results in item order.
+        """
+        if self.max_concurrency == 1 or len(items) < 2:
+            return predict(items)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as executor:
+            chunks = executor.map(lambda item: predict([item]), items)
+            return [result for chunk in chunks for result in chunk]
+
 
-        client = Client(self.hf_space, hf_token=self.hf_token)
+    async def _afan_out(self, items, apredict):
+        """
+        Async version of _fan_out, apredict returns an awaitable. Concurrent requests are bounded by a semaphore.
+        """
+        if self.max_concurrency == 1 or len(items) < 2:
+            return await apredict(items)
 
-        # Extract and prepare the absolute paths for all file paths in input_data
-        file_paths = [
-            os.path.abspath(file_path)
-            for data in input_data
-            for file_path in data["file_path"]
-        ]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
 
-        # Validate file existence and prepare files for the Gradio client
-        image_files = [handle_file(path) for path in file_paths if os.path.exists(path)]
+        async def predict_item(item):
+            async with semaphore:
+                return await apredict([item])
 
-        results = client.predict(
-            input_imgs=image_files,
-            text_input=input_data[0]["text_input"],  # Single shared text input for all images
-            api_name="/run_inference"  # Specify the Gradio API endpoint
+        chunks = await asyncio.gather(*(predict_item(item) for item in items))
+        return [result for chunk in chunks for result in chunk]
+
+
+    def _image_request(self, file_paths, text_input):
+        # The token budget is only sent when set, Spaces deployed before it was added do not accept it
+        budget = {"max_image_tokens": self.max_image_tokens} if self.max_image_tokens else {}
+
+        return dict(
+            input_imgs=[handle_file(path) for path in file_paths],
+            text_input=text_input,  # Single shared text input for all images
+            api_name="/run_inference",  # Specify the Gradio API endpoint
+            **budget
+        )
+
+
+    @staticmethod
+    def _text_request(page_texts, text_input):
+        return dict(
+            page_texts=json.dumps(page_texts),
+            text_input=text_input,
+            api_name="/run_text_inference"
         )
 
+
+    def _predict(self, request):
+        with self._client() as client:
+            results = client.predict(**request)
+
         # Convert the string into a Python list
-        parsed_results = ast.literal_eval(results)
+        return ast.literal_eval(results)
+
+
+    def _report_upload(self, file_paths):
+        self.bytes_sent = sum(os.path.getsize(path) for path in file_paths)
+        print(f"Uploading {len(file_paths)} image(s) to {self.hf_space}: {self.bytes_sent / 1024:.1f} KB "
+              f"({self.upload_format}, quality {self.upload_quality})")
+
+
+    def _check_text_endpoint(self):
+        # Spaces deployed before the text endpoint was added only serve image inference
+        key = (self.hf_space, self.hf_token)
+        if key not in self._text_endpoints:
+            with self._client() as client:
+                endpoints = client.view_api(print_info=False, return_format="dict")["named_endpoints"]
+            self._text_endpoints[key] = "/run_text_inference" in endpoints
+
+        if not self._text_endpoints[key]:
+            raise NotImplementedError(f"Space {self.hf_space} has no /run_text_inference endpoint")
+
+
+    def inference(self, input_data, mode=None):
+        if mode == "static":
+            simple_json = self.get_simple_json()
+            return [simple_json]
+
+        # Every image is encoded to a temporary file for upload
+        temp_dir = tempfile.mkdtemp()
+        try:
+            file_paths = self._prepare_upload_files(input_data, temp_dir)
+            self._report_upload(file_paths)
+
+            text_input = input_data[0]["text_input"]
+            parsed_results = self._fan_out(file_paths,
+                                           lambda paths: self._predict(self._image_request(paths, text_input)))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
 
         results_array = []
         for page_output in parsed_results:
             page_result = self.process_response(page_output)
             results_array.append(page_result)
 
-        return results_array
\ No newline at end of file
+        return results_array
+
+
+    async def ainference(self, input_data, mode=None):
+        if mode == "static":
+            return [self.get_simple_json()]
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            # Encoding is CPU work, the requests themselves are awaited
+            file_paths = await asyncio.to_thread(self._prepare_upload_files, input_data, temp_dir)
+            self._report_upload(file_paths)
+
+            text_input = input_data[0]["text_input"]
+            parsed_results = await self._afan_out(
+                file_paths, lambda paths: self._apredict(self._image_request(paths, text_input)))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        return [self.process_response(page_output) for page_output in parsed_results]
+
+
+    def text_inference(self, input_data, mode=None):
+        if mode == "static":
+            simple_json = self.get_simple_json()
+            return [simple_json]
+
+        self._check_text_endpoint()
+
+        text_input = input_data[0]["text_input"]
+        parsed_results = self._fan_out(input_data[0]["page_text"],
+                                       lambda page_texts: self._predict(self._text_request(page_texts, text_input)))
+
+        return [self.process_response(page_output) for page_output in parsed_results]
+
+
+    async def atext_inference(self, input_data, mode=None):
+        if mode == "static":
+            return [self.get_simple_json()]
+
+        await asyncio.to_thread(self._check_text_endpoint)
+
+        text_input = input_data[0]["text_input"]
+        parsed_results = await self._afan_out(
+            input_data[0]["page_text"], lambda page_texts: self._apredict(self._text_request(page_texts, text_input)))
+
+        return [self.process_response(page_output) for page_output in parsed_results]
+
+
+    def _prepare_upload_files(self, input_data, temp_dir):
+        """
+        Encodes all images in input_data to temp_dir for upload and returns their paths.
+
+        Images are resized to the size the Space resizes them to (max_image_size and the visual token budget,
+        in whole patches), so no pixels are uploaded only to be discarded, and compressed with the upload
+        encoder. Files that do not exist are skipped.
+        """
+        file_paths = []
+        for data in input_data:
+            for file_path in data["file_path"]:
+                if not ImageOptimizer.is_in_memory(file_path) and not os.path.exists(file_path):
+                    continue
+
+                image = ImageOptimizer.load_image(file_path)
+                width, height, _ = fit_token_budget(image.width, image.height, self.max_image_tokens,
+                                                    self.max_image_size)
+                encoded = ImageOptimizer.encode_image(image, (width, height), self.upload_format,
+                                                      self.upload_quality, self.upload_grayscale)
+                if image is not file_path:
+                    image.close()
+
+                extension = self.UPLOAD_EXTENSIONS[self.upload_format]
+                upload_path = os.path.join(temp_dir, f"page_{len(file_paths) + 1}.{extension}")
+                with open(upload_path, "wb") as f:
+                    f.write(encoded)
+                file_paths.append(upload_path)
+        return file_paths
@@ -1,13 +1,55 @@
 from abc import ABC, abstractmethod
+import asyncio
 import json
 
 
 class ModelInference(ABC):
+    # Largest (width, height) image the backend passes to the model, None when unbounded.
+    # Pages are rasterized to fit this size instead of being downscaled after rendering.
+    max_image_size = None
+    # Largest number of visual tokens per image, None when only max_image_size bounds it.
+    # Lower budgets trade resolution for faster generation
+    max_image_tokens = None
+    # Generation settings that affect the output, part of the result cache key
+    generation_params = {}
+    # Called with each chunk of generated text during inference() by backends that stream tokens, None otherwise.
+    # Set per page by the extractor when progress is reported
+    token_callback = None
+
+    @property
+    def model_id(self):
+        """Identifies the backend and model, results of different models are never shared."""
+        return type(self).__name__
+
     @abstractmethod
     def inference(self, input_data, mode=None):
         """This method should be implemented by subclasses."""
         pass
 
+    def text_inference(self, input_data, mode=None):
+        """
+        Runs the query against extracted page text instead of page images, one result per text
+        in input_data[0]["page_text"]. Backends without a text-only path raise NotImplementedError
+        and the pages are sent through inference() instead.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support text-only inference")
+
+    async def ainference(self, input_data, mode=None):
+        """
+        Async version of inference(). Remote backends override it with a native async client, local backends
+        run inference() in the default executor so the event loop is not blocked during generation.
+        """
+        return await asyncio.to_thread(self.inference, input_data, mode)
+
+    async def atext_inference(self, input_data, mode=None):
+        """Async version of text_inference(), run in the default executor unless the backend overrides it."""
+        return await asyncio.to_thread(self.text_inference, input_data, mode)
+
+    @staticmethod
+    def get_text_query(text_input, page_text):
+        """Combines the user query with the extracted page text into a single text-only prompt."""
+        return f"{text_input}\n\nDocument page text:\n{page_text}"
+
     def get_simple_json(self):
         # Define a simple data structure
         data = {
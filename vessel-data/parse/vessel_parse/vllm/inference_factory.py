@@ -1,6 +1,7 @@
 from vessel_parse.vllm.huggingface_inference import HuggingFaceInference
 from vessel_parse.vllm.local_gpu_inference import LocalGPUInference
 from vessel_parse.vllm.mlx_inference import MLXInference
+from vessel_parse.vllm.cached_inference import CachedInference
 
 
 class InferenceFactory:
@@ -8,13 +9,29 @@ class InferenceFactory:
         self.config = config
 
     def get_inference_instance(self):
+        backend = self._get_backend()
+
+        # Results are cached unless the config opts out with "result_cache": False.
+        # Local GPU models take raw tensors rather than images and prompts, there is nothing to key them on
+        if self.config.get("result_cache", True) and not isinstance(backend, LocalGPUInference):
+            return CachedInference(backend)
+        return backend
+
+    def _get_backend(self):
         if self.config["method"] == "huggingface":
-            return HuggingFaceInference(hf_space=self.config["hf_space"], hf_token=self.config["hf_token"])
+            return HuggingFaceInference(hf_space=self.config["hf_space"], hf_token=self.config["hf_token"],
+                                        max_image_tokens=self.config.get("max_image_tokens"),
+                                        upload_format=self.config.get("upload_format", "JPEG"),
+                                        upload_quality=self.config.get("upload_quality", 85),
+                                        upload_grayscale=self.config.get("upload_grayscale", "auto"),
+                                        max_concurrency=self.config.get("hf_concurrency", 1))
         elif self.config["method"] == "local_gpu":
             model = self._load_local_model()  # Replace with actual model loading logic
             return LocalGPUInference(model=model, device=self.config.get("device", "cuda"))
         elif self.config["method"] == "mlx":
-            return MLXInference(model_name=self.config["model_name"])
+            return MLXInference(model_name=self.config["model_name"],
+                                max_image_tokens=self.config.get("max_image_tokens"),
+                                stop_on_json_complete=self.config.get("json_early_stop", True))
         else:
             raise ValueError(f"Unknown method: {self.config['method']}")
 
@@ -1,17 +1,41 @@
 import gradio as gr
 import spaces
-from transformers import Qwen2VLForConditionalGeneration, AutoProcessor
+from transformers import Qwen2VLForConditionalGeneration, AutoProcessor, StoppingCriteria, StoppingCriteriaList
 from qwen_vl_utils import process_vision_info
 from PIL import Image
 from datetime import datetime
+import json
+import math
 import os
+import re
+import torch
 
 # subprocess.run('pip install flash-attn --no-build-isolation', env={'FLASH_ATTENTION_SKIP_CUDA_BUILD': "TRUE"}, shell=True)
 
 DESCRIPTION = "[Vessel Qwen2-VL-7B Backend](https://github.com/vesselgpt/vessel)"
 
+# Requests processed at the same time per endpoint, clients can fan out pages up to this limit
+CONCURRENCY_LIMIT = int(os.getenv("CONCURRENCY_LIMIT", "1"))
 
-def array_to_image_path(image_filepath, max_width=1250, max_height=1750):
+# Qwen2-VL encodes each 28x28 pixel block of the image as one visual token
+PATCH_SIZE = 28
+
+MAX_NEW_TOKENS = 4096
+
+
+def fit_token_budget(width, height, max_tokens=None, max_width=1250, max_height=1750):
+    # Same as vessel_parse.helpers.vision_tokens.fit_token_budget, the Space is deployed on its own
+    scale = min(1.0, max_width / width, max_height / height)
+    if max_tokens:
+        scale = min(scale, math.sqrt(max_tokens * PATCH_SIZE * PATCH_SIZE / (width * height)))
+
+    new_width = max(int(width * scale) // PATCH_SIZE, 1) * PATCH_SIZE
+    new_height = max(int(height * scale) // PATCH_SIZE, 1) * PATCH_SIZE
+
+    return new_width, new_height, (new_width // PATCH_SIZE) * (new_height // PATCH_SIZE)
+
+
+def array_to_image_path(image_filepath, max_width=1250, max_height=1750, max_tokens=None):
     if image_filepath is None:
         raise ValueError("No image provided. Please upload an image before submitting.")
 
@@ -22,7 +46,7 @@ def array_to_image_path(image_filepath, max_width=1250, max_height=1750):
     input_image_extension = image_filepath.split('.')[-1].lower()  # Extract extension from filepath
 
     # Set file extension based on the original file, otherwise default to PNG
-    if input_image_extension in ['jpg', 'jpeg', 'png']:
+    if input_image_extension in ['jpg', 'jpeg', 'png', 'webp']:
         file_extension = input_image_extension
     else:
         file_extension = 'png'  # Default to PNG if extension is unavailable or invalid
@@ -30,21 +54,9 @@ def array_to_image_path(image_filepath, max_width=1250, max_height=1750):
     # Get the current dimensions of the image
     width, height = img.size
 
-    # Initialize new dimensions to current size
-    new_width, new_height = width, height
-
-    # Check if the image exceeds the maximum dimensions
-    if width > max_width or height > max_height:
-        # Calculate the new size, maintaining the aspect ratio
-        aspect_ratio = width / height
-
-        if width > max_width:
-            new_width = max_width
-            new_height = int(new_width / aspect_ratio)
-
-        if new_height > max_height:
-            new_height = max_height
-            new_width = int(new_height * aspect_ratio)
+    # Fit the maximum dimensions and the visual token budget, in whole patches
+    new_width, new_height, tokens = fit_token_budget(width, height, max_tokens, max_width, max_height)
+    print(f"Image resized to {new_width}x{new_height}, {tokens} visual tokens")
 
     # Generate a unique filename using timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -69,13 +81,136 @@ model = Qwen2VLForConditionalGeneration.from_pretrained(
 processor = AutoProcessor.from_pretrained("Qwen/Qwen2-VL-7B-Instruct")
 
 
+# Text allowed on a line before the JSON value starts: nothing, or an opening code fence such as ```json
+_VALUE_LINE_PREFIX = re.compile(r"\s*(```[\w-]*\s*)?")
+
+
+class JsonCompletionTracker(object):
+    """
+    Same as vessel_parse.helpers.json_completion.JsonCompletionTracker, the Space is deployed on its own.
+
+    Tracks generated text chunk by chunk and detects when the top-level JSON object or array is complete.
+
+    Brace/bracket depth and string state (including escapes) are updated incrementally, so each chunk is scanned
+    once. The value has to start a line or follow an opening code fence, so a bracket inside a preamble such as
+    "Here are the fields [see below]:" is not taken for it, and the closed span has to parse as JSON. A candidate
+    that does not parse is dropped and scanning goes on. Generation can stop as soon as the value closes,
+    instead of running on into closing code fences or trailing commentary.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.complete = False
+        self._in_string = False
+        self._escape = False
+        # Text of the current line before a value starts, and the chunks of the value once it has
+        self._line = ""
+        self._span = []
+
+    def feed(self, text):
+        """
+        Consumes the next chunk of generated text.
+
+        Args:
+            text (str): Newly generated text
+
+        Returns:
+            int: Position in text right after the closing bracket of the top-level value, or -1 while it is open
+        """
+        if self.complete:
+            return 0
+
+        span_start = 0
+        for i, char in enumerate(text):
+            if not self.started:
+                if char in "{[" and _VALUE_LINE_PREFIX.fullmatch(self._line):
+                    self.started = True
+                    self.depth = 1
+                    span_start = i
+                elif char == "\n":
+                    self._line = ""
+                else:
+                    self._line += char
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self._span.append(text[span_start:i + 1])
+                    if self._close_span():
+                        return i + 1
+
+        if self.started:
+            self._span.append(text[span_start:])
+        return -1
+
+    def _close_span(self):
+        """Checks the closed candidate value. Returns True if it is valid JSON, otherwise resets the tracker."""
+        try:
+            json.loads("".join(self._span))
+        except ValueError:
+            self.started = False
+            self._span = []
+            # Scanning resumes in the middle of a line
+            self._line = "]"
+            return False
+
+        self.complete = True
+        return True
+
+
+class JsonCompleteCriteria(StoppingCriteria):
+    """
+    Stops generation once the top-level JSON object or array of the answer is closed and parses.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.tracker = JsonCompletionTracker()
+
+    def __call__(self, input_ids, scores, **kwargs):
+        # Called once per generated token, only the new token is scanned
+        self.tracker.feed(self.tokenizer.decode(input_ids[0, -1:]))
+        return torch.full((input_ids.shape[0],), self.tracker.complete, dtype=torch.bool, device=input_ids.device)
+
+
+def generate_answer(inputs):
+    json_complete = JsonCompleteCriteria(processor.tokenizer)
+    generated_ids = model.generate(**inputs, max_new_tokens=MAX_NEW_TOKENS,
+                                   stopping_criteria=StoppingCriteriaList([json_complete]))
+    generated_ids_trimmed = [
+        out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
+    ]
+    raw_output = processor.batch_decode(
+        generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=True
+    )
+
+    generated = len(generated_ids_trimmed[0])
+    if json_complete.tracker.complete:
+        print(f"JSON complete after {generated} tokens, generation stopped before end of sequence")
+    else:
+        print(f"Generated {generated} tokens")
+    return raw_output[0]
+
+
 @spaces.GPU
-def run_inference(input_imgs, text_input):
+def run_inference(input_imgs, text_input, max_image_tokens=None):
     results = []
+    max_image_tokens = int(max_image_tokens) if max_image_tokens else None
 
     for image in input_imgs:
         # Convert each image to the required format
-        image_path, width, height = array_to_image_path(image)
+        image_path, width, height = array_to_image_path(image, max_tokens=max_image_tokens)
 
         try:
             # Prepare messages for each image
@@ -113,15 +248,7 @@ def run_inference(input_imgs, text_input):
             inputs = inputs.to("cuda")
 
             # Generate inference output
-            generated_ids = model.generate(**inputs, max_new_tokens=4096)
-            generated_ids_trimmed = [
-                out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-            ]
-            raw_output = processor.batch_decode(
-                generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=True
-            )
-
-            results.append(raw_output[0])
+            results.append(generate_answer(inputs))
             print("Processed: " + image)
         finally:
             # Clean up the temporary image file
@@ -130,6 +257,40 @@ def run_inference(input_imgs, text_input):
     return results
 
 
+@spaces.GPU
+def run_text_inference(page_texts, text_input):
+    # Digital-born PDF pages are sent as their extracted text layer, without an image
+    results = []
+
+    for page_text in json.loads(page_texts):
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"{text_input}\n\nDocument page text:\n{page_text}"
+                    }
+                ]
+            }
+        ]
+
+        text = processor.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=True
+        )
+
+        inputs = processor(
+            text=[text],
+            padding=True,
+            return_tensors="pt",
+        )
+        inputs = inputs.to("cuda")
+
+        results.append(generate_answer(inputs))
+
+    return results
+
+
 css = """
   #output {
     height: 500px; 
@@ -145,11 +306,25 @@ with gr.Blocks(css=css) as demo:
             with gr.Column():
                 input_imgs = gr.Files(file_types=["image"], label="Upload Document Images")
                 text_input = gr.Textbox(label="Query")
+                max_image_tokens = gr.Number(label="Max Visual Tokens per Image (0 for no budget)", value=0,
+                                             precision=0)
                 submit_btn = gr.Button(value="Submit", variant="primary")
             with gr.Column():
                 output_text = gr.Textbox(label="Response")
 
-        submit_btn.click(run_inference, [input_imgs, text_input], [output_text])
+        submit_btn.click(run_inference, [input_imgs, text_input, max_image_tokens], [output_text],
+                         concurrency_limit=CONCURRENCY_LIMIT)
+    with gr.Tab(label="Qwen2-VL-7B Text Input"):
+        with gr.Row():
+            with gr.Column():
+                page_texts = gr.Textbox(label="Page Texts (JSON list)")
+                text_query = gr.Textbox(label="Query")
+                text_submit_btn = gr.Button(value="Submit", variant="primary")
+            with gr.Column():
+                text_output = gr.Textbox(label="Response")
+
+        text_submit_btn.click(run_text_inference, [page_texts, text_query], [text_output],
+                              api_name="run_text_inference", concurrency_limit=CONCURRENCY_LIMIT)
 
 demo.queue(api_open=True)
 demo.launch(debug=True)
\ No newline at end of file
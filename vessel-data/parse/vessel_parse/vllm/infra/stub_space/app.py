@@ -0,0 +1,81 @@
+import gradio as gr
+from PIL import Image
+import json
+import os
+import time
+
+# Local stand-in for the Qwen2-VL Space, serving the same endpoints without a model. Point the Hugging Face
+# backend at it to test the client (pooling, page fan-out, upload encoding) without a GPU:
+#
+#   python app.py
+#   {"method": "huggingface", "hf_space": "http://127.0.0.1:7860/", "hf_token": None, "hf_concurrency": 4}
+
+DESCRIPTION = "Vessel Stub Backend"
+
+# Simulated generation time per page, in seconds
+DELAY = float(os.getenv("STUB_DELAY", "1.0"))
+# Requests processed at the same time per endpoint, as in the real Space
+CONCURRENCY_LIMIT = int(os.getenv("CONCURRENCY_LIMIT", "4"))
+
+
+def run_inference(input_imgs, text_input, max_image_tokens=None):
+    results = []
+
+    for image in input_imgs:
+        with Image.open(image) as img:
+            width, height = img.size
+            mode = img.mode
+
+        time.sleep(DELAY)
+        results.append(json.dumps({
+            "file": os.path.basename(image),
+            "width": width,
+            "height": height,
+            "mode": mode,
+            "bytes": os.path.getsize(image),
+            "query": text_input
+        }))
+        print("Processed: " + image)
+
+    return results
+
+
+def run_text_inference(page_texts, text_input):
+    results = []
+
+    for page_text in json.loads(page_texts):
+        time.sleep(DELAY)
+        results.append(json.dumps({"chars": len(page_text), "query": text_input}))
+
+    return results
+
+
+with gr.Blocks() as demo:
+    gr.Markdown(DESCRIPTION)
+    with gr.Tab(label="Image Input"):
+        with gr.Row():
+            with gr.Column():
+                input_imgs = gr.Files(file_types=["image"], label="Upload Document Images")
+                text_input = gr.Textbox(label="Query")
+                max_image_tokens = gr.Number(label="Max Visual Tokens per Image (0 for no budget)", value=0,
+                                             precision=0)
+                submit_btn = gr.Button(value="Submit", variant="primary")
+            with gr.Column():
+                output_text = gr.Textbox(label="Response")
+
+        submit_btn.click(run_inference, [input_imgs, text_input, max_image_tokens], [output_text],
+                         concurrency_limit=CONCURRENCY_LIMIT)
+    with gr.Tab(label="Text Input"):
+        with gr.Row():
+            with gr.Column():
+                page_texts = gr.Textbox(label="Page Texts (JSON list)")
+                text_query = gr.Textbox(label="Query")
+                text_submit_btn = gr.Button(value="Submit", variant="primary")
+            with gr.Column():
+                text_output = gr.Textbox(label="Response")
+
+        text_submit_btn.click(run_text_inference, [page_texts, text_query], [text_output],
+                              api_name="run_text_inference", concurrency_limit=CONCURRENCY_LIMIT)
+
+demo.queue(api_open=True)
+demo.launch()
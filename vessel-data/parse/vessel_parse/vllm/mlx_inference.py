@@ -1,9 +1,14 @@
-from mlx_vlm import load, generate
+from mlx_vlm import load, generate, stream_generate
 from mlx_vlm.prompt_utils import apply_chat_template
 from mlx_vlm.utils import load_image
 from vessel_parse.vllm.inference_base import ModelInference
+from vessel_parse.helpers.image_optimizer import ImageOptimizer
+from vessel_parse.helpers.vision_tokens import fit_token_budget
+from vessel_parse.helpers.json_completion import JsonCompletionTracker
+from vessel_parse.vllm.model_registry import ModelRegistry
 import os
 import json
+import threading
 from rich import print
 
 
@@ -12,27 +17,88 @@ class MLXInference(ModelInference):
         A class for performing inference using the MLX model.
         Handles image preprocessing, response formatting, and model interaction.
         """
+    max_image_size = (1250, 1750)
+    # Greedy decoding, the output is deterministic for a given image and prompt
+    generation_params = {"max_tokens": 4000, "temperature": 0.0}
+    # Loaded models are shared by all instances in the process, see get_model_registry
+    _registry = None
+    _registry_lock = threading.Lock()
 
-    def __init__(self, model_name):
+    def __init__(self, model_name, max_image_tokens=None, stop_on_json_complete=True):
         """
         Initialize the inference class with the given model name.
 
         :param model_name: Name of the model to load.
+        :param max_image_tokens: Visual token budget per image. Images are resized to fit it, in 28x28 patches.
+        :param stop_on_json_complete: Stop generation as soon as the top-level JSON value of the response closes,
+            instead of generating closing fences and trailing text up to max_tokens.
         """
         self.model_name = model_name
+        self.max_image_tokens = max_image_tokens
+        self.stop_on_json_complete = stop_on_json_complete
         print(f"MLXInference initialized for model: {model_name}")
 
 
+    @property
+    def model_id(self):
+        # The token budget changes the image the model sees, results are only shared for the same budget
+        if self.max_image_tokens:
+            return f"mlx:{self.model_name}:{self.max_image_tokens}"
+        return f"mlx:{self.model_name}"
+
+
+    @classmethod
+    def get_model_registry(cls):
+        """
+        Returns the process-wide registry of loaded MLX models.
+
+        It is configured with the VESSEL_MODEL_MEMORY_MB (memory budget of resident models, unlimited by default)
+        and VESSEL_MODEL_IDLE_TIMEOUT (seconds before an unused model is unloaded, never by default)
+        environment variables.
+        """
+        with cls._registry_lock:
+            if cls._registry is None:
+                memory_budget_mb = os.getenv("VESSEL_MODEL_MEMORY_MB")
+                idle_timeout = os.getenv("VESSEL_MODEL_IDLE_TIMEOUT")
+                cls._registry = ModelRegistry(
+                    load,
+                    memory_budget_bytes=int(memory_budget_mb) * 1024 * 1024 if memory_budget_mb else None,
+                    idle_timeout=float(idle_timeout) if idle_timeout else None,
+                    size_fn=cls._model_size,
+                    on_unload=cls._release_memory
+                )
+            return cls._registry
+
     @staticmethod
-    def _load_model_and_processor(model_name):
+    def _model_size(loaded):
+        """
+        Returns the size in bytes of the weights of a loaded (model, processor) pair.
+        """
+        from mlx.utils import tree_flatten
+
+        return sum(value.nbytes for _, value in tree_flatten(loaded[0].parameters()))
+
+    @staticmethod
+    def _release_memory(model_name):
+        """
+        Returns the buffers freed by an unloaded model to the system.
         """
-        Load the model and processor for inference.
+        import mlx.core as mx
+
+        if hasattr(mx, "clear_cache"):
+            mx.clear_cache()
+        else:
+            mx.metal.clear_cache()
+
+    @classmethod
+    def _load_model_and_processor(cls, model_name):
+        """
+        Load the model and processor for inference, or return the copy already resident in the process.
 
         :param model_name: Name of the model to load.
         :return: Tuple containing the loaded model and processor.
         """
-        model, processor = load(model_name)
-        print(f"Loaded model: {model_name}")
+        model, processor = cls.get_model_registry().get(model_name)
         return model, processor
 
 
@@ -57,26 +123,29 @@ class MLXInference(ModelInference):
             return output_text
 
 
-    def load_image_data(self, image_filepath, max_width=1250, max_height=1750):
+    def load_image_data(self, image_filepath, max_width=max_image_size[0], max_height=max_image_size[1],
+                        max_tokens=None):
         """
-        Load and resize image while maintaining its aspect ratio.
+        Load an image and compute its size for the model, maintaining its aspect ratio.
 
-        :param image_filepath: Path to the image file.
+        The size fits max_width x max_height and the visual token budget, snapped to 28x28 patches,
+        so the number of image tokens is known before generation.
+
+        :param image_filepath: Path to the image file, raw bytes or an in-memory PIL image.
         :param max_width: Maximum allowed width of the image.
         :param max_height: Maximum allowed height of the image.
-        :return: Tuple containing the image object and its new dimensions.
+        :param max_tokens: Visual token budget. Defaults to max_image_tokens.
+        :return: Tuple containing the image object, its new dimensions and its visual token count.
         """
-        image = load_image(image_filepath)  # Assuming load_image is defined elsewhere
+        if ImageOptimizer.is_in_memory(image_filepath):
+            image = ImageOptimizer.load_image(image_filepath).convert("RGB")
+        else:
+            image = load_image(image_filepath)
         width, height = image.size
 
-        # Calculate new dimensions while maintaining the aspect ratio
-        if width > max_width or height > max_height:
-            aspect_ratio = width / height
-            new_width = min(max_width, int(max_height * aspect_ratio))
-            new_height = min(max_height, int(max_width / aspect_ratio))
-            return image, new_width, new_height
-
-        return image, width, height
+        new_width, new_height, tokens = fit_token_budget(width, height, max_tokens or self.max_image_tokens,
+                                                         (max_width, max_height))
+        return image, new_width, new_height, tokens
 
 
     def inference(self, input_data, mode=None):
@@ -98,8 +167,10 @@ class MLXInference(ModelInference):
         file_paths = self._extract_file_paths(input_data)
 
         results = []
-        for file_path in file_paths:
-            image, width, height = self.load_image_data(file_path)
+        generation_stats = []
+        for page_num, file_path in enumerate(file_paths, start=1):
+            image, width, height, image_tokens = self.load_image_data(file_path)
+            print(f"Image for page {page_num} resized to {width}x{height}, {image_tokens} visual tokens")
 
             # Prepare messages for the chat model
             messages = [
@@ -109,32 +180,105 @@ class MLXInference(ModelInference):
 
             # Generate and process response
             prompt = apply_chat_template(processor, config, messages)  # Assuming defined
-            response = generate(
-                model,
-                processor,
-                prompt,
-                image,
-                resize_shape=(width, height),
-                max_tokens=4000,
-                temperature=0.0,
-                verbose=False
-            )
+            response = self._generate(model, processor, prompt, image, generation_stats, resize_shape=(width, height))
+            results.append(self.process_response(response))
+
+            print("Inference completed successfully for: ",
+                  f"page {page_num}" if ImageOptimizer.is_in_memory(file_path) else file_path)
+
+        self._report_generation(generation_stats)
+        return results
+
+    def _generate(self, model, processor, prompt, image=None, generation_stats=None, **kwargs):
+        """
+        Generates the response for a prompt and optional image.
+
+        Without early stopping or a token callback, this is a single generate() call. Otherwise the response is
+        generated chunk by chunk: each chunk goes to token_callback, and with stop_on_json_complete generation
+        stops right after the top-level JSON value closes.
+
+        :param generation_stats: List to append (tokens generated, stopped early) to, for streamed generation.
+        :return: The generated text.
+        """
+        images = () if image is None else (image,)
+        if not self.stop_on_json_complete and self.token_callback is None:
+            return generate(model, processor, prompt, *images, verbose=False, **kwargs, **self.generation_params)
+
+        tracker = JsonCompletionTracker() if self.stop_on_json_complete else None
+        chunks = []
+        stopped_early = False
+        for chunk in stream_generate(model, processor, prompt, *images, **kwargs, **self.generation_params):
+            # Recent mlx_vlm versions yield GenerationResult objects, older ones plain strings
+            text = getattr(chunk, "text", chunk)
+            end = tracker.feed(text) if tracker is not None else -1
+            if end >= 0:
+                text = text[:end]
+            chunks.append(text)
+            if self.token_callback is not None and text:
+                self.token_callback(text)
+            if end >= 0:
+                stopped_early = True
+                break
+
+        if generation_stats is not None:
+            generation_stats.append((len(chunks), stopped_early))
+        return "".join(chunks)
+
+    def _report_generation(self, generation_stats):
+        """
+        Prints how many responses stopped at the end of their JSON value and the tokens generated. The tokens
+        saved are those the model would have generated before its end of sequence, which is not known, so
+        only the count of early stops is reported.
+        """
+        if not generation_stats or not self.stop_on_json_complete:
+            return
+
+        stopped = sum(1 for _, stopped_early in generation_stats if stopped_early)
+        generated = sum(tokens for tokens, _ in generation_stats)
+        print(f"JSON early stop: {stopped} of {len(generation_stats)} responses stopped when their JSON closed, "
+              f"{generated} tokens generated")
+
+    def text_inference(self, input_data, mode=None):
+        """
+        Perform text-only inference on page text extracted from the PDF text layer, without an image.
+
+        :param input_data: A list with a dictionary holding the page texts ("page_text") and the query ("text_input").
+        :param mode: Optional mode for inference ("static" for simple JSON output).
+        :return: List of processed model responses, one per page text.
+        """
+        if mode == "static":
+            return [self.get_simple_json()]
+
+        model, processor = self._load_model_and_processor(self.model_name)
+        config = model.config
+
+        results = []
+        generation_stats = []
+        for page_num, page_text in enumerate(input_data[0]["page_text"], start=1):
+            messages = [
+                {"role": "system", "content": "You are an expert at extracting structured text from documents."},
+                {"role": "user", "content": self.get_text_query(input_data[0]["text_input"], page_text)},
+            ]
+
+            prompt = apply_chat_template(processor, config, messages, num_images=0)
+            response = self._generate(model, processor, prompt, generation_stats=generation_stats)
             results.append(self.process_response(response))
 
-            print("Inference completed successfully for: ", file_path)
+            print("Text inference completed successfully for: ", f"page {page_num}")
 
+        self._report_generation(generation_stats)
         return results
 
     @staticmethod
     def _extract_file_paths(input_data):
         """
-        Extract and resolve absolute file paths from input data.
+        Extract and resolve absolute file paths from input data. In-memory images are passed through.
 
-        :param input_data: List of dictionaries containing image file paths.
-        :return: List of absolute file paths.
+        :param input_data: List of dictionaries containing image file paths or in-memory images.
+        :return: List of absolute file paths and in-memory images.
         """
         return [
-            os.path.abspath(file_path)
+            file_path if ImageOptimizer.is_in_memory(file_path) else os.path.abspath(file_path)
             for data in input_data
             for file_path in data.get("file_path", [])
         ]
\ No newline at end of file
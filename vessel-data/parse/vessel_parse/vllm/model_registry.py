@@ -0,0 +1,170 @@
+from collections import OrderedDict
+from rich import print
+import threading
+import time
+
+
+class ModelRegistry(object):
+    """
+    Process-wide registry of loaded models, keyed by model name.
+
+    The first request for a model loads it with the loader, later requests get the resident copy. Models are
+    unloaded least recently used first when their total estimated size exceeds the memory budget, and after
+    idle_timeout seconds without a request. The model that was just requested is never evicted, so a model
+    larger than the budget still loads and stays resident alone.
+    """
+
+    def __init__(self, loader, memory_budget_bytes=None, idle_timeout=None, size_fn=None, on_unload=None,
+                 clock=time.monotonic):
+        """
+        :param loader: Called with the model name, returns the loaded model (any object, e.g. a (model, processor) tuple).
+        :param memory_budget_bytes: Largest total size of resident models. None keeps every loaded model.
+        :param idle_timeout: Seconds without a request after which a model is unloaded. None keeps idle models.
+        :param size_fn: Called with a loaded model, returns its size in bytes. Models count as 0 bytes without it.
+        :param on_unload: Called with the model name after a model is dropped, e.g. to release accelerator caches.
+        :param clock: Time source in seconds, replaceable in tests.
+        """
+        self.loader = loader
+        self.memory_budget_bytes = memory_budget_bytes
+        self.idle_timeout = idle_timeout
+        self.size_fn = size_fn
+        self.on_unload = on_unload
+        self.clock = clock
+        self.counters = {"hits": 0, "loads": 0, "load_seconds": 0.0, "evictions": 0, "idle_unloads": 0}
+        # name -> [model, size_bytes, last_used]
+        self._models = OrderedDict()
+        self._load_seconds = {}
+        self._lock = threading.Lock()
+        self._loading_locks = {}
+        self._reaper = None
+        self._stop = threading.Event()
+
+    def get(self, name):
+        """
+        Returns the loaded model for a name, loading it on the first request.
+        """
+        with self._lock:
+            idle = self._unload_idle_locked()
+            entry = self._touch_locked(name)
+            if entry is None:
+                loading_lock = self._loading_locks.setdefault(name, threading.Lock())
+            else:
+                self.counters["hits"] += 1
+        self._notify_unloaded(idle, "idle timeout")
+        if entry is not None:
+            return entry[0]
+
+        # Concurrent requests for the same model wait for a single load
+        with loading_lock:
+            with self._lock:
+                entry = self._touch_locked(name)
+                if entry is not None:
+                    self.counters["hits"] += 1
+                    return entry[0]
+
+            start = self.clock()
+            model = self.loader(name)
+            load_seconds = self.clock() - start
+            size_bytes = self.size_fn(model) if self.size_fn is not None else 0
+
+            with self._lock:
+                self._models[name] = [model, size_bytes, self.clock()]
+                self._load_seconds[name] = load_seconds
+                self.counters["loads"] += 1
+                self.counters["load_seconds"] += load_seconds
+                evicted = self._evict_locked(keep=name)
+
+        print(f"Loaded model {name} in {load_seconds:.1f}s ({size_bytes / 1024 ** 2:.0f} MB)")
+        self._notify_unloaded(evicted, "memory budget")
+        self._start_reaper()
+        return model
+
+    def unload(self, name):
+        """Drops a model from the registry. Returns True if it was resident."""
+        with self._lock:
+            entry = self._models.pop(name, None)
+        if entry is None:
+            return False
+        self._notify_unloaded([name], "unload")
+        return True
+
+    def unload_idle(self):
+        """Drops the models idle for longer than idle_timeout. Returns their names."""
+        with self._lock:
+            names = self._unload_idle_locked()
+        self._notify_unloaded(names, "idle timeout")
+        return names
+
+    def clear(self):
+        """Drops all models and stops the idle reaper."""
+        with self._lock:
+            self._stop.set()
+            self._stop = threading.Event()
+            self._reaper = None
+            names = list(self._models)
+            self._models.clear()
+        self._notify_unloaded(names, "clear")
+
+    def stats(self):
+        """Returns the hit, load and eviction counters, resident models and their sizes, and load times."""
+        with self._lock:
+            return dict(self.counters,
+                        resident=list(self._models),
+                        resident_bytes=sum(entry[1] for entry in self._models.values()),
+                        model_load_seconds=dict(self._load_seconds))
+
+    def _touch_locked(self, name):
+        entry = self._models.get(name)
+        if entry is not None:
+            entry[2] = self.clock()
+            self._models.move_to_end(name)
+        return entry
+
+    def _evict_locked(self, keep):
+        evicted = []
+        if self.memory_budget_bytes is None:
+            return evicted
+
+        total = sum(entry[1] for entry in self._models.values())
+        for name in list(self._models):
+            if total <= self.memory_budget_bytes:
+                break
+            if name == keep:
+                continue
+            total -= self._models.pop(name)[1]
+            self.counters["evictions"] += 1
+            evicted.append(name)
+        return evicted
+
+    def _unload_idle_locked(self):
+        if self.idle_timeout is None:
+            return []
+
+        now = self.clock()
+        names = [name for name, entry in self._models.items() if now - entry[2] > self.idle_timeout]
+        for name in names:
+            del self._models[name]
+            self.counters["idle_unloads"] += 1
+        return names
+
+    def _notify_unloaded(self, names, reason):
+        for name in names:
+            print(f"Unloaded model {name} ({reason})")
+            if self.on_unload is not None:
+                self.on_unload(name)
+
+    def _start_reaper(self):
+        # Idle models are also unloaded when no request comes in, checked from a daemon thread
+        if self.idle_timeout is None or self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap, args=(self._stop,), name="model-registry-reaper",
+                                            daemon=True)
+            self._reaper.start()
+
+    def _reap(self, stop):
+        interval = max(min(self.idle_timeout / 2, 60), 1)
+        while not stop.wait(interval):
+            self.unload_idle()
@@ -2,10 +2,23 @@ from typing import Dict, List, Any
 from prefect import flow, task
 from .vessel_client import VesselClient
 import configparser
+import asyncio
 import io
 from pypdf import PdfReader
 from pdf2image import convert_from_bytes
+from concurrent.futures import ProcessPoolExecutor
+import concurrent.futures
 import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import uuid
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
 
 
 # Create a ConfigParser object
@@ -31,6 +44,94 @@ class DocumentError(Exception):
     pass
 
 
+_worker_pdf = None
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    """
+    Returns the process-wide pdfium render pool, started on first use. Workers are spawned rather than
+    forked, so they do not inherit the event loop and Prefect threads of this process.
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                               mp_context=multiprocessing.get_context("spawn"))
+        return _render_pool
+
+
+def _render_page_png(pdf_path: str, document_key: str, page_num: int, dpi: int) -> bytes:
+    """
+    Renders a single PDF page to PNG bytes with pdfium. Runs in a worker process, which keeps the last
+    document open so that the pages of a document open it once per worker.
+    """
+    global _worker_pdf
+    if _worker_pdf is None or _worker_pdf[0] != document_key:
+        if _worker_pdf is not None:
+            _worker_pdf[1].close()
+        _worker_pdf = (document_key, pdfium.PdfDocument(pdf_path))
+
+    page = _worker_pdf[1][page_num - 1]
+    try:
+        image = page.render(scale=dpi / 72).to_pil()
+    finally:
+        page.close()
+
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format='PNG')
+    return img_byte_arr.getvalue()
+
+
+def render_pages_png(content: bytes, page_numbers: List[int], dpi: int = 300) -> Dict[int, bytes]:
+    """
+    Renders the selected PDF pages to PNG bytes.
+    Uses in-process pdfium rendering in parallel across a process pool when pypdfium2 is installed,
+    otherwise falls back to pdf2image and poppler.
+
+    Args:
+        content: Raw PDF content
+        page_numbers: 1-based page numbers to render, all within the document
+        dpi: Rendering resolution
+
+    Returns:
+        Dictionary mapping page number to PNG bytes
+    """
+    if not page_numbers:
+        return {}
+
+    if pdfium is not None:
+        # Workers open the document from a file, instead of receiving its bytes with every page
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as pdf_file:
+            pdf_file.write(content)
+        document_key = uuid.uuid4().hex
+        futures = []
+        try:
+            for page_num in page_numbers:
+                futures.append(_get_render_pool().submit(_render_page_png, pdf_file.name, document_key, page_num, dpi))
+            return {page_num: future.result() for page_num, future in zip(page_numbers, futures)}
+        finally:
+            for future in futures:
+                future.cancel()
+            concurrent.futures.wait(futures)
+            os.remove(pdf_file.name)
+
+    # A single poppler run over the selected range, pages in between that are not selected are dropped
+    first_page, last_page = min(page_numbers), max(page_numbers)
+    images = convert_from_bytes(content, dpi=dpi, fmt='png', first_page=first_page, last_page=last_page)
+
+    rendered = {}
+    for page_num, image in enumerate(images, start=first_page):
+        if page_num not in page_numbers:
+            continue
+        img_byte_arr = io.BytesIO()
+        image.save(img_byte_arr, format='PNG')
+        rendered[page_num] = img_byte_arr.getvalue()
+
+    return rendered
+
+
 @task(name="detect_doc_structure")
 async def detect_doc_structure(input_data: Dict[str, Any], vessel_client: VesselClient) -> Dict:
     """
@@ -76,27 +177,25 @@ async def split_document(input_data: Dict[str, Any], doc_structure: Dict) -> Lis
         List of dictionaries containing page images and their types
     """
     page_types = {item['page']: item['page_type'] for item in doc_structure}
+    page_count = len(PdfReader(io.BytesIO(input_data['content'])).pages)
 
-    images = convert_from_bytes(
-        input_data['content'],
-        dpi=300,
-        fmt='png'
-    )
-
-    pages = []
-    for page_num, image in enumerate(images, start=1):
-        current_page_type = page_types.get(page_num)
-
-        # Only process pages whose type is in the configured list
+    # Only render pages of the document whose type is in the configured list
+    page_numbers = []
+    for page_num, current_page_type in sorted(page_types.items()):
+        if not 1 <= page_num <= page_count:
+            logger.info(f"Skipping page {page_num} - document has {page_count} pages")
+            continue
         if current_page_type not in page_type_list:
             logger.info(f"Skipping page {page_num} - type {current_page_type} not in configured types")
             continue
+        page_numbers.append(page_num)
 
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='PNG')
+    rendered_pages = await asyncio.to_thread(render_pages_png, input_data['content'], page_numbers, 300)
 
+    pages = []
+    for page_num in page_numbers:
         pages.append({
-            'content': img_byte_arr.getvalue(),
+            'content': rendered_pages[page_num],
             'page_type': page_types[page_num]
         })
 
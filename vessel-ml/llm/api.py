@@ -1,11 +1,16 @@
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from engine import run_from_api_engine
+from fastapi.responses import StreamingResponse
+from engine import run_from_api_engine, stream_from_api_engine, parse_crop_size
+from pipelines.vessel_parse.inference_pool import InferencePool
+from pipelines.vessel_parse.vessel_parse import warm_up_worker
+from contextlib import asynccontextmanager
 import uvicorn
 import warnings
 from typing import Annotated, Optional
 import json
 import argparse
+import os
 from dotenv import load_dotenv
 import box
 import yaml
@@ -35,7 +40,29 @@ config_path = 'config.yml'
 cfg = load_config(config_path)
 
 
-app = FastAPI(openapi_url="/api/v1/vessel-llm/openapi.json", docs_url="/api/v1/vessel-llm/docs")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm inference workers are started with the API and reused by every request. Local backends keep a model
+    # in memory per worker, so they get one worker by default. Remote backends mostly wait on the Space and get
+    # a worker per CPU (up to 8), so concurrent requests do not queue. A pool size of 0 runs each of its
+    # requests in a new subprocess instead
+    pool_sizes = {
+        "local": int(os.getenv("VESSEL_INFERENCE_WORKERS", "1")),
+        "remote": int(os.getenv("VESSEL_REMOTE_INFERENCE_WORKERS", str(min(os.cpu_count() or 1, 8))))
+    }
+    max_rss_mb = os.getenv("VESSEL_WORKER_MAX_RSS_MB")
+    for name, num_workers in pool_sizes.items():
+        if num_workers > 0:
+            InferencePool.start_default(name,
+                                        num_workers=num_workers,
+                                        max_jobs_per_worker=int(os.getenv("VESSEL_WORKER_MAX_JOBS", "100")),
+                                        max_rss_mb=int(max_rss_mb) if max_rss_mb else None,
+                                        initializer=warm_up_worker)
+    yield
+    InferencePool.shutdown_default()
+
+
+app = FastAPI(openapi_url="/api/v1/vessel-llm/openapi.json", docs_url="/api/v1/vessel-llm/docs", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -51,18 +78,44 @@ def root():
     return {"message": "Vessel LLM API"}
 
 
-def parse_optional_int(value: Optional[str]) -> Optional[int]:
-    """Handle empty strings and None values for integer fields."""
-    if value is None or value.strip() == "":
-        return None
+@app.post("/api/v1/vessel-llm/inference", tags=["LLM Inference"])
+async def inference(
+        query: Annotated[str, Form()],
+        pipeline: Annotated[str, Form()],
+        options: Annotated[Optional[str], Form()] = None,
+        crop_size: Annotated[Optional[str], Form()] = None,
+        page_type: Annotated[Optional[str], Form()] = None,
+        debug_dir: Annotated[Optional[str], Form()] = None,
+        debug: Annotated[Optional[bool], Form()] = False,
+        vessel_key: Annotated[Optional[str], Form()] = None,
+        pages: Annotated[Optional[str], Form()] = None,
+        no_cache: Annotated[Optional[bool], Form()] = False,
+        file: UploadFile = File(None)
+        ):
+    processed_crop_size, options_arr, page_type_arr = prepare_request(crop_size, vessel_key, options, page_type,
+                                                                      no_cache)
+
     try:
-        return int(value)
-    except ValueError:
-        raise ValueError("Invalid integer value provided")
+        answer = await run_from_api_engine(pipeline, query, options_arr, processed_crop_size, page_type_arr,
+                                           file, debug_dir, debug, pages.strip() if pages else None)
+    except ValueError as e:
+        raise HTTPException(status_code=418, detail=str(e))
 
+    try:
+        if isinstance(answer, (str, bytes, bytearray)):
+            answer = json.loads(answer)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=418, detail=answer)
 
-@app.post("/api/v1/vessel-llm/inference", tags=["LLM Inference"])
-async def inference(
+    if debug:
+        print(f"\nJSON response:\n")
+        print(answer)
+
+    return answer
+
+
+@app.post("/api/v1/vessel-llm/inference/stream", tags=["LLM Inference"])
+async def inference_stream(
         query: Annotated[str, Form()],
         pipeline: Annotated[str, Form()],
         options: Annotated[Optional[str], Form()] = None,
@@ -71,12 +124,53 @@ async def inference(
         debug_dir: Annotated[Optional[str], Form()] = None,
         debug: Annotated[Optional[bool], Form()] = False,
         vessel_key: Annotated[Optional[str], Form()] = None,
+        pages: Annotated[Optional[str], Form()] = None,
+        no_cache: Annotated[Optional[bool], Form()] = False,
         file: UploadFile = File(None)
         ):
+    """
+    Same inputs as /inference. The response is NDJSON, one progress event per line: "accepted", "start", "page_start",
+    "token" (backends that stream tokens), "page" with the validated result of each page, "heartbeat"
+    while nothing else happens, and "done" with the final answer, or "error".
+    """
+    processed_crop_size, options_arr, page_type_arr = prepare_request(crop_size, vessel_key, options, page_type,
+                                                                      no_cache)
+
+    # The upload is read now, it is closed once this function returns
+    file_name = file.filename if file is not None else None
+    file_content = await file.read() if file is not None else None
+
+    async def events():
+        try:
+            async for event in stream_from_api_engine(pipeline, query, options_arr, processed_crop_size,
+                                                      page_type_arr, file_name, file_content, debug_dir, debug,
+                                                      pages.strip() if pages else None):
+                if event["event"] == "done" and isinstance(event["result"], (str, bytes, bytearray)):
+                    try:
+                        event = dict(event, result=json.loads(event["result"]))
+                    except json.JSONDecodeError:
+                        event = {"event": "error", "detail": event["result"]}
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            # Headers are already sent, errors are reported in the stream
+            yield json.dumps({"event": "error", "detail": str(e)}) + "\n"
+
+    # Ask reverse proxies not to buffer the stream
+    return StreamingResponse(events(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def prepare_request(crop_size, vessel_key, options, page_type, no_cache):
+    """
+    Validates the crop size and the vessel key, and splits the options and page types.
+
+    Returns:
+        tuple: (crop_size, options_arr, page_type_arr)
+    """
     try:
-        processed_crop_size = parse_optional_int(crop_size)
+        processed_crop_size = parse_crop_size(crop_size)
     except ValueError:
-        raise HTTPException(status_code=422, detail="crop_size must be a valid integer or empty")
+        raise HTTPException(status_code=422, detail="crop_size must be a valid integer, 'auto' or empty")
 
     protected_access = cfg.PROTECTED_ACCESS
     if protected_access:
@@ -112,23 +206,11 @@ async def inference(
     options_arr = [param.strip() for param in options.split(',')] if options is not None else None
     page_type_arr = [param.strip() for param in page_type.split(',')] if options is not None and page_type else None
 
-    try:
-        answer = await run_from_api_engine(pipeline, query, options_arr, processed_crop_size, page_type_arr,
-                                           file, debug_dir, debug)
-    except ValueError as e:
-        raise HTTPException(status_code=418, detail=str(e))
+    if no_cache:
+        # Skip the inference result cache for this request, also when no options are sent
+        options_arr = (options_arr or []) + ["no_cache"]
 
-    try:
-        if isinstance(answer, (str, bytes, bytearray)):
-            answer = json.loads(answer)
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=418, detail=answer)
-
-    if debug:
-        print(f"\nJSON response:\n")
-        print(answer)
-
-    return answer
+    return processed_crop_size, options_arr, page_type_arr
 
 
 if __name__ == "__main__":
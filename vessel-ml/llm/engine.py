@@ -17,21 +17,35 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
 
+def parse_crop_size(value):
+    """Returns the crop size in pixels, "auto" for cropping to the page content, or None when empty."""
+    if value is None or str(value).strip() == "":
+        return None
+    if str(value).strip().lower() == "auto":
+        return "auto"
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError("Invalid crop size, use a number of pixels or 'auto'")
+
+
 def run(query: Annotated[str, typer.Argument(help="The list of fields to fetch")],
         file_path: Annotated[str, typer.Option(help="The file to process")] = None,
         pipeline: Annotated[str, typer.Option(help="Selected pipeline")] = "vessel-parse",
         options: Annotated[List[str], typer.Option(help="Options to pass to the pipeline")] = None,
-        crop_size: Annotated[int, typer.Option(help="Crop size for table extraction")] = None,
+        crop_size: Annotated[str, typer.Option(help="Crop size in pixels, or 'auto' to crop to the content")] = None,
         page_type: Annotated[List[str], typer.Option(help="Page type query")] = None,
         debug_dir: Annotated[str, typer.Option(help="Debug folder for multipage")] = None,
-        debug: Annotated[bool, typer.Option(help="Enable debug mode")] = False):
+        debug: Annotated[bool, typer.Option(help="Enable debug mode")] = False,
+        pages: Annotated[str, typer.Option(help="PDF pages to process, e.g. 3-5,7")] = None):
 
     user_selected_pipeline = pipeline  # Modify this as needed
 
     try:
+        crop_size = parse_crop_size(crop_size)
         rag = get_pipeline(user_selected_pipeline)
         answer = rag.run_pipeline(user_selected_pipeline, query, file_path, options, crop_size, page_type,
-                                  debug_dir, debug, False)
+                                  debug_dir, debug, False, pages)
 
         print(f"\nJSON response:\n")
         print(answer)
@@ -39,7 +53,8 @@ def run(query: Annotated[str, typer.Argument(help="The list of fields to fetch")
         print(f"Caught an exception: {e}")
 
 
-async def run_from_api_engine(user_selected_pipeline, query, options_arr, crop_size, page_type, file, debug_dir, debug):
+async def run_from_api_engine(user_selected_pipeline, query, options_arr, crop_size, page_type, file, debug_dir, debug,
+                              pages=None):
     try:
         rag = get_pipeline(user_selected_pipeline)
 
@@ -52,16 +67,38 @@ async def run_from_api_engine(user_selected_pipeline, query, options_arr, crop_s
                     content = await file.read()
                     temp_file.write(content)
 
-                answer = rag.run_pipeline(user_selected_pipeline, query, temp_file_path, options_arr, crop_size, page_type,
-                                          debug_dir, debug, False)
+                answer = await rag.run_pipeline_async(user_selected_pipeline, query, temp_file_path, options_arr,
+                                                      crop_size, page_type, debug_dir, debug, False, pages)
         else:
-            answer = rag.run_pipeline(user_selected_pipeline, query, None, options_arr, crop_size, page_type,
-                                      debug_dir, debug, False)
+            answer = await rag.run_pipeline_async(user_selected_pipeline, query, None, options_arr, crop_size,
+                                                  page_type, debug_dir, debug, False, pages)
     except ValueError as e:
         raise e
 
     return answer
 
 
+async def stream_from_api_engine(user_selected_pipeline, query, options_arr, crop_size, page_type, file_name,
+                                 file_content, debug_dir, debug, pages=None):
+    """
+    Streaming version of run_from_api_engine, an async generator of the pipeline's progress events.
+    The upload is passed as its name and content, it is written to a temporary file kept until the stream ends.
+    """
+    rag = get_pipeline(user_selected_pipeline)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_file_path = None
+        if file_name is not None:
+            temp_file_path = os.path.join(temp_dir, file_name)
+
+            # Save the uploaded file to the temporary directory
+            with open(temp_file_path, 'wb') as temp_file:
+                temp_file.write(file_content)
+
+        async for event in rag.run_pipeline_stream(user_selected_pipeline, query, temp_file_path, options_arr,
+                                                   crop_size, page_type, debug_dir, debug, False, pages):
+            yield event
+
+
 if __name__ == "__main__":
     typer.run(run)
@@ -7,7 +7,7 @@ import timeit
 import box
 import yaml
 from rich import print
-from typing import Any, List
+from typing import Any, List, Union
 import warnings
 
 
@@ -21,11 +21,12 @@ class Stocks(Pipeline):
                      query: str,
                      file_path: str,
                      options: List[str] = None,
-                     crop_size: int = None,
+                     crop_size: Union[int, str] = None,
                      page_type: List[str] = None,
                      debug_dir: str = None,
                      debug: bool = False,
-                     local: bool = True) -> Any:
+                     local: bool = True,
+                     pages: str = None) -> Any:
         print(f"\nRunning pipeline with {pipeline}\n")
 
         # Import config vars
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 from typing import Any
 from typing import List
+from typing import Union
+import asyncio
 import warnings
 
 
@@ -16,13 +18,22 @@ class Pipeline(ABC):
                      query: str,
                      file_path: str,
                      options: List[str] = None,
-                     crop_size: int = None,
+                     crop_size: Union[int, str] = None,
                      page_type: List[str] = None,
                      debug_dir: str = None,
                      debug: bool = False,
-                     local: bool = True) -> Any:
+                     local: bool = True,
+                     pages: str = None) -> Any:
         pass
 
+    async def run_pipeline_async(self, *args, **kwargs) -> Any:
+        # Pipelines without a native async path run in the default executor, off the event loop
+        return await asyncio.to_thread(self.run_pipeline, *args, **kwargs)
+
+    async def run_pipeline_stream(self, *args, **kwargs):
+        # Pipelines without progress events stream their final answer only
+        yield {"event": "done", "result": await self.run_pipeline_async(*args, **kwargs)}
+
 
 # Factory Method
 def get_pipeline(pipeline_name: str) -> Pipeline:
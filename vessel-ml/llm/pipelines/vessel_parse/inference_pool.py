@@ -0,0 +1,356 @@
+# Standard library imports
+import atexit
+import concurrent.futures
+import itertools
+import multiprocessing
+import pickle
+import queue
+import resource
+import sys
+import threading
+
+# Third-party library imports
+from rich import print
+
+
+def _peak_rss_bytes():
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def _picklable_exception(error):
+    """
+    Returns the exception itself when it can be sent back to the parent process, otherwise a RuntimeError
+    with its message.
+    """
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+def _worker_main(worker_id, jobs, results, current_job, max_jobs, max_rss_bytes, initializer):
+    """
+    Worker process loop. Runs jobs from the queue until it is told to stop, or retires itself after
+    max_jobs jobs or once its peak resident memory exceeds max_rss_bytes.
+
+    The id of the job taken is written to current_job before it runs. Queue messages are sent from a feeder
+    thread and are lost if the process dies, the shared value tells the parent which job a dead worker had.
+    """
+    if initializer is not None:
+        initializer()
+    # A worker that dies before this message failed to start
+    results.put(("ready", worker_id))
+
+    completed = 0
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+
+        job_id, fn, args, kwargs, with_events = job
+        current_job.value = job_id
+        if with_events:
+            # Progress events go back to the parent through the result queue, ahead of the job result
+            kwargs = dict(kwargs, progress_callback=lambda event, job_id=job_id: results.put(
+                ("event", worker_id, job_id, event)))
+        results.put(("started", worker_id, job_id))
+        try:
+            results.put(("done", worker_id, job_id, True, fn(*args, **kwargs)))
+        except Exception as e:
+            results.put(("done", worker_id, job_id, False, _picklable_exception(e)))
+
+        completed += 1
+        if completed >= max_jobs:
+            results.put(("retired", worker_id, f"{completed} jobs"))
+            break
+        if max_rss_bytes and _peak_rss_bytes() > max_rss_bytes:
+            results.put(("retired", worker_id, f"peak memory {_peak_rss_bytes() / 2 ** 20:.0f} MB"))
+            break
+
+
+class InferencePool(object):
+    """
+    Long-lived pool of inference worker processes.
+
+    Workers are spawned once and take jobs from a shared queue, so everything a job leaves behind in its
+    worker process (imported modules, backend instances, loaded models, caches) is reused by the next job.
+    A worker is replaced by a fresh one after max_jobs_per_worker jobs, once its peak resident memory
+    exceeds max_rss_mb, or when it dies. A job whose worker dies fails with a RuntimeError.
+
+    Workers are not daemonic, since jobs start process pools of their own (e.g. the pdfium renderer).
+    They are stopped by shutdown, which also runs at interpreter exit. After MAX_START_FAILURES workers
+    in a row die before they are ready, e.g. when the initializer raises, failed workers are no longer
+    replaced, and once none is left pending and new jobs fail.
+    """
+    MAX_START_FAILURES = 3
+    # Process-wide pools by name, e.g. one for local backends and one for remote backends
+    _defaults = {}
+    _default_lock = threading.Lock()
+
+    def __init__(self, num_workers=1, max_jobs_per_worker=100, max_rss_mb=None, initializer=None):
+        """
+        :param num_workers: Number of worker processes, i.e. jobs that run at the same time.
+        :param max_jobs_per_worker: Jobs after which a worker is replaced.
+        :param max_rss_mb: Peak resident memory after which a worker is replaced, checked after each job.
+        :param initializer: Top-level function called once in each new worker, e.g. to import heavy modules.
+        """
+        self.num_workers = num_workers
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024 if max_rss_mb else None
+        self.initializer = initializer
+        self.counters = {"jobs": 0, "failed": 0, "recycled": 0, "crashed": 0, "start_failures": 0}
+
+        # MLX, Metal and CUDA state does not survive fork, workers always start from a fresh interpreter
+        self._context = multiprocessing.get_context("spawn")
+        self._jobs = None
+        self._results = None
+        self._workers = {}
+        self._ready = set()
+        self._start_failures = 0
+        self._broken = False
+        self._current_jobs = {}
+        self._running = {}
+        self._futures = {}
+        self._event_callbacks = {}
+        self._job_ids = itertools.count()
+        self._worker_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._stopping = False
+
+    @classmethod
+    def start_default(cls, name="local", **kwargs):
+        """Starts a process-wide pool used by the pipeline, see get_default."""
+        with cls._default_lock:
+            if name not in cls._defaults:
+                pool = cls(**kwargs)
+                pool.start()
+                cls._defaults[name] = pool
+            return cls._defaults[name]
+
+    @classmethod
+    def get_default(cls, name="local"):
+        """Returns a process-wide pool, or None when it was not started."""
+        return cls._defaults.get(name)
+
+    @classmethod
+    def shutdown_default(cls):
+        """Stops the process-wide pools."""
+        with cls._default_lock:
+            for pool in cls._defaults.values():
+                pool.shutdown()
+            cls._defaults.clear()
+
+    def start(self):
+        """Spawns the worker processes."""
+        self._jobs = self._context.Queue()
+        self._results = self._context.Queue()
+        with self._lock:
+            for _ in range(self.num_workers):
+                self._spawn_worker_locked()
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name="inference-pool-dispatcher", daemon=True)
+        self._dispatcher.start()
+        # multiprocessing joins non-daemonic children at exit, the workers have to be told to stop first
+        atexit.register(self.shutdown)
+        print(f"Inference pool started with {self.num_workers} worker(s)")
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues fn(*args, **kwargs) to run in a worker. fn has to be a top-level function, and its arguments
+        and result have to be picklable.
+
+        :return: concurrent.futures.Future with the result.
+        """
+        return self._submit(fn, args, kwargs, None)
+
+    def submit_with_events(self, fn, event_callback, *args, **kwargs):
+        """
+        Like submit, and fn is also called with a progress_callback keyword argument. Every object the job passes
+        to progress_callback is sent back and handed to event_callback, in order and before the future completes.
+        event_callback runs on the pool's dispatcher thread and should return quickly.
+        """
+        return self._submit(fn, args, kwargs, event_callback)
+
+    def _submit(self, fn, args, kwargs, event_callback):
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._stopping or self._dispatcher is None:
+                raise RuntimeError("Inference pool is not running")
+            if self._broken and not self._workers:
+                raise RuntimeError("Inference pool workers fail to start")
+            job_id = next(self._job_ids)
+            self._futures[job_id] = future
+            if event_callback is not None:
+                self._event_callbacks[job_id] = event_callback
+            self.counters["jobs"] += 1
+        self._jobs.put((job_id, fn, args, kwargs, event_callback is not None))
+        return future
+
+    def shutdown(self, timeout=30):
+        """Stops the workers once the jobs already queued have run, terminating those still busy after timeout."""
+        atexit.unregister(self.shutdown)
+        with self._lock:
+            self._stopping = True
+            workers = list(self._workers.values())
+
+        for _ in workers:
+            self._jobs.put(None)
+        for process in workers:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+
+        with self._lock:
+            for future in self._futures.values():
+                if not future.cancel():
+                    future.set_exception(RuntimeError("Inference pool was shut down"))
+            self._futures.clear()
+            self._event_callbacks.clear()
+            self._workers.clear()
+            self._ready.clear()
+
+    def stats(self):
+        """Returns the job, failure and worker recycling counters, and the live and busy worker counts."""
+        with self._lock:
+            return dict(self.counters, workers=len(self._workers), busy=len(self._running),
+                        queued=len(self._futures) - len(self._running))
+
+    def _spawn_worker_locked(self):
+        worker_id = next(self._worker_ids)
+        current_job = self._context.Value("q", -1, lock=False)
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, self._jobs, self._results, current_job, self.max_jobs_per_worker, self.max_rss_bytes,
+                  self.initializer),
+            name=f"inference-worker-{worker_id}",
+            daemon=False
+        )
+        process.start()
+        self._workers[worker_id] = process
+        self._current_jobs[worker_id] = current_job
+
+    def _dispatch(self):
+        # Resolves futures from worker messages, and replaces retired and dead workers
+        while True:
+            with self._lock:
+                if self._stopping and not self._workers_alive_locked():
+                    break
+            try:
+                self._handle(self._results.get(timeout=0.5))
+            except queue.Empty:
+                pass
+            self._check_workers()
+
+    def _workers_alive_locked(self):
+        return any(process.is_alive() for process in self._workers.values())
+
+    def _handle(self, message):
+        kind, worker_id = message[0], message[1]
+        if kind == "event":
+            with self._lock:
+                event_callback = self._event_callbacks.get(message[2])
+            if event_callback is not None:
+                event_callback(message[3])
+            return
+
+        with self._lock:
+            if kind == "ready":
+                self._ready.add(worker_id)
+                self._start_failures = 0
+                self._broken = False
+            elif kind == "started":
+                job_id = message[2]
+                self._running[worker_id] = job_id
+                future = self._futures.get(job_id)
+                if future is not None and not future.set_running_or_notify_cancel():
+                    self._futures.pop(job_id)
+            elif kind == "done":
+                job_id, ok, payload = message[2:]
+                self._running.pop(worker_id, None)
+                self._event_callbacks.pop(job_id, None)
+                future = self._futures.pop(job_id, None)
+                if future is not None and not future.cancelled():
+                    if ok:
+                        future.set_result(payload)
+                    else:
+                        self.counters["failed"] += 1
+                        future.set_exception(payload)
+            elif kind == "retired":
+                process = self._workers.pop(worker_id, None)
+                self._current_jobs.pop(worker_id, None)
+                self._ready.discard(worker_id)
+                if process is not None:
+                    process.join()
+                    self.counters["recycled"] += 1
+                    print(f"Inference worker {worker_id} recycled after {message[2]}")
+                    if not self._stopping:
+                        self._spawn_worker_locked()
+
+    def _check_workers(self):
+        with self._lock:
+            dead = [worker_id for worker_id, process in self._workers.items() if not process.is_alive()]
+        if not dead:
+            return
+
+        # A dead worker has flushed all its messages, drain them before treating it as crashed
+        while True:
+            try:
+                self._handle(self._results.get_nowait())
+            except queue.Empty:
+                break
+
+        with self._lock:
+            for worker_id in dead:
+                process = self._workers.pop(worker_id, None)
+                current_job = self._current_jobs.pop(worker_id, None)
+                self._running.pop(worker_id, None)
+                if process is None:
+                    continue
+                if self._stopping and process.exitcode == 0:
+                    continue
+
+                if worker_id not in self._ready:
+                    self._start_failed_locked(worker_id, process.exitcode)
+                    continue
+                self._ready.discard(worker_id)
+
+                self.counters["crashed"] += 1
+                print(f"Inference worker {worker_id} exited with code {process.exitcode}")
+                # Still pending after the drain only if the worker died before its result was sent
+                self._event_callbacks.pop(current_job.value, None)
+                future = self._futures.pop(current_job.value, None)
+                if future is not None:
+                    self.counters["failed"] += 1
+                    future.set_exception(RuntimeError(f"Inference worker exited with code {process.exitcode}"))
+                if not self._stopping:
+                    self._spawn_worker_locked()
+
+    def _start_failed_locked(self, worker_id, exitcode):
+        self.counters["start_failures"] += 1
+        self._start_failures += 1
+        print(f"Inference worker {worker_id} failed to start, exit code {exitcode}")
+        if self._stopping:
+            return
+        if self._start_failures < self.MAX_START_FAILURES:
+            self._spawn_worker_locked()
+            return
+
+        # Respawning would fail the same way, give up once no worker is left to take jobs
+        self._broken = True
+        print(f"Inference pool stopped spawning workers after {self._start_failures} failed starts")
+        if self._workers:
+            return
+        for future in self._futures.values():
+            if not future.cancelled():
+                self.counters["failed"] += 1
+                future.set_exception(RuntimeError("Inference pool workers fail to start"))
+        self._futures.clear()
+        self._event_callbacks.clear()
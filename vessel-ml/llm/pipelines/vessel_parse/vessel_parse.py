@@ -1,9 +1,11 @@
 # Standard library imports
+import asyncio
+import copy
 import json
 import os
 import timeit
 import warnings
-from typing import Any, List, Tuple, Optional, Dict
+from typing import Any, List, Tuple, Optional, Dict, Union
 from datetime import datetime
 
 # Third-party library imports
@@ -16,8 +18,10 @@ from .vessel_utils import (
     is_valid_json,
     get_json_keys_as_string,
     add_validation_message,
-    add_page_number
+    add_page_number,
+    is_blank_page_result
 )
+from .inference_pool import InferencePool
 import concurrent.futures
 from pipelines.interface import Pipeline
 
@@ -26,16 +30,58 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
 
-def subprocess_inference(config, input_data, tables_only, crop_size, query_all_data, debug_dir, debug):
+# Number of pages prepared ahead of inference when the 'pipelined' option is set
+PIPELINED_PREFETCH_PAGES = 2
+
+# Inference backends created in this process, by config. In warm pool workers they are reused across requests
+_inference_instances = {}
+
+# Seconds without a progress event after which a stream sends a heartbeat, so clients and proxies keep it open
+STREAM_HEARTBEAT_SECONDS = 10
+
+# Backends that send inference to a remote service. Their requests mostly wait on I/O and run on the "remote"
+# worker pool, sized for concurrency, instead of the "local" pool that holds models in memory
+REMOTE_INFERENCE_METHODS = ("huggingface",)
+
+
+def warm_up_worker():
     """
-    Subprocess function to execute the inference logic.
+    Imports the inference modules, called once in each inference pool worker.
+    """
+    import vessel_parse.extractors.vllm_extractor
+    import vessel_parse.vllm.inference_factory
+
+
+def get_inference_pool(config):
+    """
+    Returns the warm worker pool for an inference backend config, or None when the API did not start one.
+    """
+    return InferencePool.get_default("remote" if config["method"] in REMOTE_INFERENCE_METHODS else "local")
+
+
+def _get_inference_instance(config):
+    """
+    Returns the inference backend for a config, created once per process.
     """
-    from vessel_parse.extractors.vllm_extractor import VLLMExtractor
     from vessel_parse.vllm.inference_factory import InferenceFactory
 
+    key = json.dumps(config, sort_keys=True)
+    if key not in _inference_instances:
+        factory = InferenceFactory(config)
+        _inference_instances[key] = factory.get_inference_instance()
+    return _inference_instances[key]
+
+
+def subprocess_inference(config, input_data, tables_only, crop_size, query_all_data, debug_dir, debug,
+                         prefetch_pages=None, pages=None, text_layer=False, skip_blank_pages=False,
+                         dedup_pages=False, progress_callback=None):
+    """
+    Subprocess function to execute the inference logic. progress_callback receives the extractor's progress events.
+    """
+    from vessel_parse.extractors.vllm_extractor import VLLMExtractor
+
     # Initialize the extractor and inference instance
-    factory = InferenceFactory(config)
-    model_inference_instance = factory.get_inference_instance()
+    model_inference_instance = _get_inference_instance(config)
     extractor = VLLMExtractor()
 
     # Run inference
@@ -47,7 +93,13 @@ def subprocess_inference(config, input_data, tables_only, crop_size, query_all_d
         crop_size=crop_size,
         debug_dir=debug_dir,
         debug=debug,
-        mode=None
+        mode=None,
+        prefetch_pages=prefetch_pages,
+        pages=pages,
+        text_layer=text_layer,
+        skip_blank_pages=skip_blank_pages,
+        dedup_pages=dedup_pages,
+        progress_callback=progress_callback
     )
 
     # Return results
@@ -64,15 +116,168 @@ class VesselParsePipeline(Pipeline):
                      query: str,
                      file_path: str,
                      options: List[str] = None,
-                     crop_size: int = None,
+                     crop_size: Union[int, str] = None,
                      page_type: List[str] = None,
                      debug_dir: str = None,
                      debug: bool = False,
-                     local: bool = True) -> Any:
+                     local: bool = True,
+                     pages: str = None) -> Any:
+        print(f"\nRunning pipeline with {pipeline}\n")
+
+        start = timeit.default_timer()
+
+        query, query_schema, query_all_data = self._build_query(query, page_type, local)
+
+        llm_output_list, num_pages, tables_only, validation_off = self.invoke_pipeline_step(lambda: self.execute_query(options,
+                                                                                                           crop_size,
+                                                                                                           query_all_data,
+                                                                                                           query,
+                                                                                                           file_path,
+                                                                                                           debug_dir,
+                                                                                                           debug,
+                                                                                                           pages),
+                                                                                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Executing query", local)
+
+        llm_output = self._finish_pipeline(llm_output_list, num_pages, query_all_data, query_schema, tables_only,
+                                           validation_off, page_type, debug, local, pages)
+
+        end = timeit.default_timer()
+
+        print(f"Time to retrieve answer: {end - start}")
+
+        return llm_output
+
+
+    async def run_pipeline_async(self,
+                                 pipeline: str,
+                                 query: str,
+                                 file_path: str,
+                                 options: List[str] = None,
+                                 crop_size: Union[int, str] = None,
+                                 page_type: List[str] = None,
+                                 debug_dir: str = None,
+                                 debug: bool = False,
+                                 local: bool = True,
+                                 pages: str = None) -> Any:
+        """
+        Async version of run_pipeline for the API. Inference is awaited on the warm worker pool, or on a
+        subprocess started from the default executor, and validation runs in the default executor, so the
+        event loop keeps serving other requests during the extraction.
+        """
         print(f"\nRunning pipeline with {pipeline}\n")
 
         start = timeit.default_timer()
 
+        query, query_schema, query_all_data = self._build_query(query, page_type, local)
+
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Executing query")
+        llm_output_list, num_pages, tables_only, validation_off = await self.execute_query_async(
+            options, crop_size, query_all_data, query, file_path, debug_dir, debug, pages)
+
+        llm_output = await asyncio.to_thread(self._finish_pipeline, llm_output_list, num_pages, query_all_data,
+                                             query_schema, tables_only, validation_off, page_type, debug, local, pages)
+
+        end = timeit.default_timer()
+
+        print(f"Time to retrieve answer: {end - start}")
+
+        return llm_output
+
+
+    async def run_pipeline_stream(self,
+                                  pipeline: str,
+                                  query: str,
+                                  file_path: str,
+                                  options: List[str] = None,
+                                  crop_size: Union[int, str] = None,
+                                  page_type: List[str] = None,
+                                  debug_dir: str = None,
+                                  debug: bool = False,
+                                  local: bool = True,
+                                  pages: str = None):
+        """
+        Streaming version of run_pipeline_async, an async generator of progress events (dicts):
+
+        - {"event": "accepted"} as soon as the request is validated, before inference is queued
+        - {"event": "start", "pages": N} when the document is opened
+        - {"event": "page_start", "page": n} when a page goes to the model
+        - {"event": "token", "page": n, "text": "..."} for each generated chunk, from backends that stream tokens
+        - {"event": "page", "page": n, "result": {...}} with the validated result of a page
+        - {"event": "heartbeat"} after STREAM_HEARTBEAT_SECONDS without another event
+        - {"event": "done", "result": ...} with the same final answer as run_pipeline
+        """
+        print(f"\nRunning pipeline with {pipeline} (streaming)\n")
+
+        start = timeit.default_timer()
+
+        query, query_schema, query_all_data = self._build_query(query, page_type, local)
+
+        inference_args, tables_only, validation_off = self._prepare_inference(options, crop_size, query_all_data, query,
+                                                                              file_path, debug_dir, debug, pages)
+        if inference_args is None:
+            yield {"event": "done", "result": "Inference backend is not set up for this option"}
+            return
+        if page_type is not None:
+            validation_off = True
+
+        yield {"event": "accepted"}
+
+        # Validated results of the pages already streamed, reused for the final answer
+        page_results = {}
+
+        # Events arrive on the pool dispatcher thread and are handed over to the event loop
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        end_of_events = object()
+
+        pool = get_inference_pool(inference_args[0])
+        # Without the warm pool, a single-use one runs the job, as the one-off subprocess does
+        own_pool = InferencePool(num_workers=1, max_jobs_per_worker=1) if pool is None else None
+        if own_pool is not None:
+            await asyncio.to_thread(own_pool.start)
+        try:
+            future = (pool or own_pool).submit_with_events(
+                subprocess_inference, lambda event: loop.call_soon_threadsafe(events.put_nowait, event),
+                *inference_args)
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, end_of_events))
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield {"event": "heartbeat"}
+                    continue
+                if event is end_of_events:
+                    break
+
+                if event["event"] == "page_done":
+                    result = await asyncio.to_thread(self._validate_page_output, event["result"], query_all_data,
+                                                     query_schema, tables_only, validation_off, debug, local,
+                                                     event["page"])
+                    page_results[event["page"]] = result
+                    yield {"event": "page", "page": event["page"],
+                           "result": add_page_number(copy.copy(result), event["page"])}
+                else:
+                    yield event
+
+            llm_output_list, num_pages = future.result()
+        finally:
+            if own_pool is not None:
+                await asyncio.to_thread(own_pool.shutdown)
+
+        llm_output = await asyncio.to_thread(self._finish_streamed_pipeline, llm_output_list, num_pages, page_results,
+                                             query_all_data, query_schema, tables_only, validation_off, debug, local,
+                                             pages)
+
+        end = timeit.default_timer()
+
+        print(f"Time to retrieve answer: {end - start}")
+
+        yield {"event": "done", "result": llm_output}
+
+
+    def _build_query(self, query: str, page_type: Optional[List[str]], local: bool) -> Tuple[Optional[str], Optional[str], bool]:
+        """Returns the model query, the query schema and whether all data is queried."""
         # Handle special case where query indicates fetching all data
         query_all_data = query == "*"
         query_schema = None
@@ -87,27 +292,58 @@ class VesselParsePipeline(Pipeline):
         else:
             query, query_schema = self._prepare_query(query, local)
 
-        llm_output_list, num_pages, tables_only, validation_off = self.invoke_pipeline_step(lambda: self.execute_query(options,
-                                                                                                           crop_size,
-                                                                                                           query_all_data,
-                                                                                                           query,
-                                                                                                           file_path,
-                                                                                                           debug_dir,
-                                                                                                           debug),
-                                                                                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Executing query", local)
+        return query, query_schema, query_all_data
+
 
+    def _finish_pipeline(self, llm_output_list, num_pages, query_all_data, query_schema, tables_only, validation_off,
+                         page_type, debug, local, pages):
+        """Validates and formats the inference output."""
         if page_type is not None:
             # if page_type is not None, we only want to get info about page type, without validating data
             validation_off = True
 
-        llm_output = self.process_llm_output(llm_output_list, num_pages, query_all_data, query_schema, tables_only,
-                                             validation_off, debug, local)
+        page_numbers = self._selected_page_numbers(pages)
 
-        end = timeit.default_timer()
+        return self.process_llm_output(llm_output_list, num_pages, query_all_data, query_schema, tables_only,
+                                       validation_off, debug, local, page_numbers)
 
-        print(f"Time to retrieve answer: {end - start}")
 
-        return llm_output
+    def _finish_streamed_pipeline(self, llm_output_list, num_pages, page_results, query_all_data, query_schema,
+                                  tables_only, validation_off, debug, local, pages):
+        """
+        Same as _finish_pipeline, reusing the page results already validated for the page events.
+        Only the pages that were not streamed are validated here.
+        """
+        if num_pages == 1:
+            llm_output = llm_output_list[0]
+            if not self._needs_validation(llm_output, query_all_data, tables_only, validation_off) or not page_results:
+                return self.process_single_page(llm_output_list, query_all_data, query_schema, tables_only,
+                                                validation_off, debug, local)
+            return json.dumps(next(iter(page_results.values())), indent=4)
+
+        if num_pages > 1:
+            page_numbers = self._selected_page_numbers(pages)
+            combined_output = []
+            for i, llm_output in enumerate(llm_output_list):
+                page_number = page_numbers[i] if page_numbers else i + 1
+                result = page_results.get(page_number)
+                if result is None:
+                    result = self._validate_page_output(llm_output, query_all_data, query_schema, tables_only,
+                                                        validation_off, debug, local, page_number)
+                combined_output.append(add_page_number(result, page_number))
+            return json.dumps(combined_output, indent=4)
+
+        return None
+
+
+    @staticmethod
+    def _selected_page_numbers(pages: Optional[str]) -> Optional[List[int]]:
+        """Returns the selected page numbers, or None when all pages are processed."""
+        if not pages:
+            return None
+
+        from vessel_parse.helpers.page_selection import parse_page_selection
+        return parse_page_selection(pages)
 
 
     def _prepare_query(self, query: str, local: bool) -> Tuple[str, Optional[Dict]]:
@@ -162,26 +398,79 @@ class VesselParsePipeline(Pipeline):
         return query
 
 
-    def execute_query(self, options, crop_size, query_all_data, query, file_path, debug_dir, debug):
+    def execute_query(self, options, crop_size, query_all_data, query, file_path, debug_dir, debug, pages=None):
         """
-        Executes the query using the specified inference backend in a subprocess.
+        Executes the query using the specified inference backend in a warm pool worker, or in a new subprocess
+        when no pool is running.
 
         Args:
             options (list): Inference backend options (e.g., ['huggingface', 'some_space']).
-            crop_size (int): Crop size for table extraction.
+            crop_size (int or str): Border crop size in pixels, or "auto" to crop to the page content.
             query_all_data (bool): Indicates if all data should be queried.
             query (str): Query text.
             file_path (str): Path to the file for querying.
             debug_dir (str): Directory for debug output.
             debug (bool): Flag for enabling debug mode.
+            pages (str): Page selection for PDFs, e.g. "3-5,7". None processes all pages.
 
         Returns:
             Tuple: (llm_output, num_pages, tables_only, validation_off)
         """
+        inference_args, tables_only, validation_off = self._prepare_inference(options, crop_size, query_all_data, query,
+                                                                              file_path, debug_dir, debug, pages)
+        if inference_args is None:
+            return "Inference backend is not set up for this option", 1, tables_only, validation_off
+
+        # Run on a warm pool worker when the API started one, backends and models stay loaded between requests
+        pool = get_inference_pool(inference_args[0])
+        if pool is not None:
+            llm_output, num_pages = pool.submit(subprocess_inference, *inference_args).result()
+        else:
+            llm_output, num_pages = self._run_in_subprocess(inference_args)
+
+        return llm_output, num_pages, tables_only, validation_off
+
+
+    async def execute_query_async(self, options, crop_size, query_all_data, query, file_path, debug_dir, debug,
+                                  pages=None):
+        """
+        Async version of execute_query. The pool job is awaited as a future, without a pool the one-off
+        subprocess is waited for in the default executor.
+        """
+        inference_args, tables_only, validation_off = self._prepare_inference(options, crop_size, query_all_data, query,
+                                                                              file_path, debug_dir, debug, pages)
+        if inference_args is None:
+            return "Inference backend is not set up for this option", 1, tables_only, validation_off
+
+        pool = get_inference_pool(inference_args[0])
+        if pool is not None:
+            llm_output, num_pages = await asyncio.wrap_future(pool.submit(subprocess_inference, *inference_args))
+        else:
+            llm_output, num_pages = await asyncio.to_thread(self._run_in_subprocess, inference_args)
+
+        return llm_output, num_pages, tables_only, validation_off
+
+
+    def _prepare_inference(self, options, crop_size, query_all_data, query, file_path, debug_dir, debug, pages):
+        """
+        Returns the subprocess_inference arguments for the options, or None when the backend is not supported,
+        with the tables_only and validation_off flags.
+        """
         # Validate and configure the inference backend
         config, tables_only, validation_off = self._configure_inference_backend(options)
         if config is None:
-            return "Inference backend is not set up for this option", 1, tables_only, validation_off
+            return None, tables_only, validation_off
+
+        extra_options = [opt.lower() for opt in options[2:]]
+
+        # 'pipelined' overlaps page pre-processing with inference, keeping a small prefetch queue
+        prefetch_pages = PIPELINED_PREFETCH_PAGES if "pipelined" in extra_options else None
+        # 'text_layer' queries digital-born PDF pages with their extracted text instead of a page image
+        text_layer = "text_layer" in extra_options
+        # 'skip_blank' gives blank and near-empty pages a placeholder result instead of running inference
+        skip_blank_pages = "skip_blank" in extra_options
+        # 'dedup' infers repeated pages once and reuses the result for every duplicate
+        dedup_pages = "dedup" in extra_options
 
         # Prepare input data for inference
         input_data = [
@@ -191,21 +480,21 @@ class VesselParsePipeline(Pipeline):
             }
         ]
 
-        # Offload inference to a subprocess
+        inference_args = (config, input_data, tables_only, crop_size, query_all_data, debug_dir, debug,
+                          prefetch_pages, pages, text_layer, skip_blank_pages, dedup_pages)
+
+        return inference_args, tables_only, validation_off
+
+
+    @staticmethod
+    def _run_in_subprocess(inference_args):
+        # Offload inference to a one-off subprocess
         with concurrent.futures.ProcessPoolExecutor() as executor:
             future = executor.submit(
                 subprocess_inference,  # Call the top-level function
-                config,
-                input_data,
-                tables_only,
-                crop_size,
-                query_all_data,
-                debug_dir,
-                debug
+                *inference_args
             )
-            llm_output, num_pages = future.result()
-
-        return llm_output, num_pages, tables_only, validation_off
+            return future.result()
 
 
     @staticmethod
@@ -222,23 +511,37 @@ class VesselParsePipeline(Pipeline):
                 - bool: True if "tables_only" is specified in the options, False otherwise.
                 - bool: True if "validation_off" is specified in the options, False otherwise.
         """
+        # 'no_cache' bypasses the inference result cache and always runs generation. It is accepted in any
+        # position, the API adds it to requests that set the no_cache field, with or without other options
+        result_cache = "no_cache" not in [opt.lower() for opt in options or []]
+        options = [opt for opt in options or [] if opt.lower() != "no_cache"]
+
         if not options or len(options) < 2:
             raise ValueError("Invalid options provided for inference backend configuration.")
 
         method = options[0].lower()
         tables_only = "tables_only" in [opt.lower() for opt in options[2:]]
         validation_off = "validation_off" in [opt.lower() for opt in options[2:]]
+        # 'image_tokens=N' caps the visual tokens per page image, lower is faster at a lower resolution
+        max_image_tokens = VesselParsePipeline._parse_int_option(options[2:], "image_tokens")
+        # 'hf_concurrency=N' sends the pages to the Space as up to N concurrent requests
+        hf_concurrency = VesselParsePipeline._parse_int_option(options[2:], "hf_concurrency") or 1
 
         if method == 'huggingface':
             return {
                 "method": method,
                 "hf_space": options[1],
-                "hf_token": os.getenv('HF_TOKEN')  # Ensure HF_TOKEN is set in the environment
+                "hf_token": os.getenv('HF_TOKEN'),  # Ensure HF_TOKEN is set in the environment
+                "result_cache": result_cache,
+                "max_image_tokens": max_image_tokens,
+                "hf_concurrency": hf_concurrency
             }, tables_only, validation_off
         elif method == 'mlx':
             return {
                 "method": method,
-                "model_name": options[1]
+                "model_name": options[1],
+                "result_cache": result_cache,
+                "max_image_tokens": max_image_tokens
             }, tables_only, validation_off
         else:
             # Extendable for additional backends
@@ -246,13 +549,31 @@ class VesselParsePipeline(Pipeline):
             return None, tables_only, validation_off
 
 
+    @staticmethod
+    def _parse_int_option(options, option_name):
+        """
+        Returns the positive integer value of a 'name=N' option, or None when it is not set.
+        """
+        for opt in options:
+            name, _, value = opt.partition("=")
+            if name.strip().lower() == option_name:
+                try:
+                    option_value = int(value)
+                except ValueError:
+                    raise ValueError(f"Invalid {option_name} option: {opt}")
+                if option_value <= 0:
+                    raise ValueError(f"Invalid {option_name} option: {opt}")
+                return option_value
+        return None
+
+
     def process_single_page(self, llm_output_list, query_all_data, query_schema, tables_only, validation_off, debug, local):
         """
         Processes a single page of LLM output, including validation and formatting if needed.
         """
         llm_output = llm_output_list[0]
 
-        if not query_all_data and not tables_only and not validation_off:
+        if not query_all_data and not tables_only and not validation_off and not is_blank_page_result(llm_output):
             validation_result = self.invoke_pipeline_step(
                 lambda: self.validate_result(llm_output, query_all_data, query_schema, debug),
                 "Validating result", local
@@ -272,45 +593,71 @@ class VesselParsePipeline(Pipeline):
         return llm_output
 
 
-    def process_multiple_pages(self, llm_output_list, query_all_data, query_schema, tables_only, validation_off, debug, local):
+    def process_multiple_pages(self, llm_output_list, query_all_data, query_schema, tables_only, validation_off, debug, local,
+                               page_numbers=None):
         """
         Processes multiple pages of LLM output, including validation (if needed), formatting, and pagination.
+        page_numbers holds the document page number of each output when only some pages were processed.
         """
         combined_output = []
 
         for i, llm_output in enumerate(llm_output_list):
-            if not query_all_data and not tables_only and not validation_off:
-                validation_result = self.invoke_pipeline_step(
-                    lambda: self.validate_result(llm_output, query_all_data, query_schema, debug),
-                    f"Validating result for page {i + 1}...", local
-                )
+            combined_output.append(self._process_page_output(llm_output, query_all_data, query_schema, tables_only,
+                                                             validation_off, debug, local,
+                                                             page_numbers[i] if page_numbers else i + 1))
 
-                try:
-                    llm_output = json.loads(llm_output) if isinstance(llm_output, str) else llm_output
-                    llm_output = add_validation_message(llm_output,
-                                                        "true" if validation_result is None else validation_result)
-                except json.JSONDecodeError:
-                    llm_output = {
-                        "message": "Invalid JSON format in LLM output",
-                        "valid": validation_result
-                    }
-            else:
-                try:
-                    llm_output = json.loads(llm_output) if isinstance(llm_output, str) else llm_output
-                except json.JSONDecodeError:
-                    llm_output = {
-                        "message": "Invalid JSON format in LLM output",
-                        "valid": "false"
-                    }
+        return json.dumps(combined_output, indent=4)
 
-            llm_output = add_page_number(llm_output, i + 1)
-            combined_output.append(llm_output)
 
-        return json.dumps(combined_output, indent=4)
+    def _process_page_output(self, llm_output, query_all_data, query_schema, tables_only, validation_off, debug, local,
+                             page_number):
+        """
+        Validates (if needed) and decodes the LLM output of one page, and labels it with its page number.
+        """
+        return add_page_number(self._validate_page_output(llm_output, query_all_data, query_schema, tables_only,
+                                                          validation_off, debug, local, page_number), page_number)
+
+
+    @staticmethod
+    def _needs_validation(llm_output, query_all_data, tables_only, validation_off):
+        # Blank pages carry a placeholder result, there is nothing to validate
+        return not query_all_data and not tables_only and not validation_off and not is_blank_page_result(llm_output)
+
+
+    def _validate_page_output(self, llm_output, query_all_data, query_schema, tables_only, validation_off, debug, local,
+                              page_number):
+        """
+        Validates (if needed) and decodes the LLM output of one page.
+        """
+        if self._needs_validation(llm_output, query_all_data, tables_only, validation_off):
+            validation_result = self.invoke_pipeline_step(
+                lambda: self.validate_result(llm_output, query_all_data, query_schema, debug),
+                f"Validating result for page {page_number}...", local
+            )
+
+            try:
+                llm_output = json.loads(llm_output) if isinstance(llm_output, str) else llm_output
+                llm_output = add_validation_message(llm_output,
+                                                    "true" if validation_result is None else validation_result)
+            except json.JSONDecodeError:
+                llm_output = {
+                    "message": "Invalid JSON format in LLM output",
+                    "valid": validation_result
+                }
+        else:
+            try:
+                llm_output = json.loads(llm_output) if isinstance(llm_output, str) else llm_output
+            except json.JSONDecodeError:
+                llm_output = {
+                    "message": "Invalid JSON format in LLM output",
+                    "valid": "false"
+                }
+
+        return llm_output
 
 
     def process_llm_output(self, llm_output_list, num_pages, query_all_data, query_schema, tables_only, validation_off,
-                           debug, local):
+                           debug, local, page_numbers=None):
         """
         Processes the LLM output based on the number of pages.
         """
@@ -319,7 +666,7 @@ class VesselParsePipeline(Pipeline):
                                             debug, local)
         if num_pages > 1:
             return self.process_multiple_pages(llm_output_list, query_all_data, query_schema, tables_only,
-                                               validation_off, debug, local)
+                                               validation_off, debug, local, page_numbers)
         return None
 
 
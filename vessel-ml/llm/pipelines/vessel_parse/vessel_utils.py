@@ -120,3 +120,21 @@ def add_page_number(data: Union[Dict, List], page: int) -> Dict:
         Dict: The modified data.
     """
     return add_message_to_data(data, "page", page)
+
+
+def is_blank_page_result(llm_output: Union[str, Dict, List]) -> bool:
+    """
+    Check if a page result is the placeholder for a blank page that skipped inference.
+
+    Args:
+        llm_output (Union[str, Dict, List]): The page result, as a JSON string or parsed data.
+
+    Returns:
+        bool: True if the page was skipped as blank, False otherwise.
+    """
+    if isinstance(llm_output, str):
+        try:
+            llm_output = json.loads(llm_output)
+        except json.JSONDecodeError:
+            return False
+    return isinstance(llm_output, dict) and llm_output.get("blank_page") == "true"